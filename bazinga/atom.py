@@ -2,13 +2,31 @@ from base.property import rocachedproperty
 from base.singleton import SingletonPool
 
 
+# Predefined atoms, their value is their index + 1
+_predefined_atoms = (
+    "PRIMARY", "SECONDARY", "ARC", "ATOM", "BITMAP", "CARDINAL", "COLORMAP",
+    "CURSOR", "CUT_BUFFER0", "CUT_BUFFER1", "CUT_BUFFER2", "CUT_BUFFER3",
+    "CUT_BUFFER4", "CUT_BUFFER5", "CUT_BUFFER6", "CUT_BUFFER7", "DRAWABLE",
+    "FONT", "INTEGER", "PIXMAP", "POINT", "RECTANGLE", "RESOURCE_MANAGER",
+    "RGB_COLOR_MAP", "RGB_BEST_MAP", "RGB_BLUE_MAP", "RGB_DEFAULT_MAP",
+    "RGB_GRAY_MAP", "RGB_GREEN_MAP", "RGB_RED_MAP", "STRING", "VISUALID",
+    "WINDOW", "WM_COMMAND", "WM_HINTS", "WM_CLIENT_MACHINE", "WM_ICON_NAME",
+    "WM_ICON_SIZE", "WM_NAME", "WM_NORMAL_HINTS", "WM_SIZE_HINTS",
+    "WM_ZOOM_HINTS", "MIN_SPACE", "NORM_SPACE", "MAX_SPACE", "END_SPACE",
+    "SUPERSCRIPT_X", "SUPERSCRIPT_Y", "SUBSCRIPT_X", "SUBSCRIPT_Y",
+    "UNDERLINE_POSITION", "UNDERLINE_THICKNESS", "STRIKEOUT_ASCENT",
+    "STRIKEOUT_DESCENT", "ITALIC_ANGLE", "X_HEIGHT", "QUAD_WIDTH", "WEIGHT",
+    "POINT_SIZE", "RESOLUTION", "COPYRIGHT", "NOTICE", "FONT_NAME",
+    "FAMILY_NAME", "FULL_NAME", "CAP_HEIGHT", "WM_CLASS", "WM_TRANSIENT_FOR",
+)
+
+
 # XXX
-# * Use predefined ATOM
 # * Stop using SingletonPool ?
 class Atom(SingletonPool, int):
-
-    # Store Atoms for ever
-    _SingletonPool__instances = {}
+    """A X atom.
+    Atoms are stored in the _atoms table of their connection, indexed by
+    name and by value, and live as long as the connection."""
 
     class name(rocachedproperty):
         def __get__(self):
@@ -24,38 +42,55 @@ class Atom(SingletonPool, int):
                                                    int(self),
                                                    id(self))
 
-    @staticmethod
-    def __getpoolkey__(connection, name_or_value="Any"):
-        return (id(connection), name_or_value)
-
     @classmethod
     def __getpool__(cls, connection, name_or_value="Any"):
-        # We use the instances pool as:
-        # (id(connection), atom name) = atom
-        if isinstance(name_or_value, str):
-            # Use standard lookup method
-            return super(Atom, cls).__getpool__(connection, name_or_value)
-        else:
-            # Iter on all atom, and as soon as we find something, return it
-            for k, v in cls._SingletonPool__instances.iteritems():
-                if k[0] == id(connection) and v == name_or_value:
-                    return v
-            else:
-                raise LookupError
+        # Names are strings and values are integers, so they can share
+        # the same table.
+        return connection._atoms.get(name_or_value)
 
     @classmethod
-    def __setpool__(cls, obj, connection, name_or_value):
-        cls._SingletonPool__instances[cls.__getpoolkey__(connection, obj.name)] = obj
+    def __setpool__(cls, obj, connection, name_or_value="Any"):
+        # Already stored by _register()
+        pass
+
+    @classmethod
+    def _register(cls, connection, value, name=None):
+        """Return the atom of value on connection, storing it and its name."""
+        atom = connection._atoms.get(value)
+        if atom is None:
+            atom = super(Atom, cls).__new__(cls, value)
+            atom.connection = connection
+            connection._atoms[value] = atom
+        if name is not None:
+            Atom.name.set_cache(atom, name)
+            connection._atoms[name] = atom
+        return atom
 
     def __new__(cls, connection, name_or_value="Any"):
         if isinstance(name_or_value, str):
             ia = connection.core.InternAtom(False,
                                             len(name_or_value),
                                             name_or_value)
-            self = super(Atom, cls).__new__(cls, ia.reply().atom)
-            Atom.name.set_cache(self, name_or_value)
-        else:
-            self = super(Atom, cls).__new__(cls, name_or_value)
-        # We need to store it now, because __setpool__ we need it
-        self.connection = connection
-        return self
+            return cls._register(connection, ia.reply().atom, name_or_value)
+        return cls._register(connection, name_or_value)
+
+    @classmethod
+    def preload(cls, connection):
+        """Store predefined atoms of a connection, without any request."""
+        for value, name in enumerate(_predefined_atoms):
+            cls._register(connection, value + 1, name)
+
+    @classmethod
+    def intern_many(cls, connection, names):
+        """Return the atoms for a list of names.
+        All InternAtom requests are sent before waiting for any reply."""
+        cookies = []
+        sent = set()
+        for name in names:
+            if name not in connection._atoms and name not in sent:
+                sent.add(name)
+                cookies.append((name,
+                                connection.core.InternAtom(False, len(name), name)))
+        for name, cookie in cookies:
+            cls._register(connection, cookie.reply().atom, name)
+        return [ connection._atoms[name] for name in names ]
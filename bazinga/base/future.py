@@ -0,0 +1,104 @@
+"""Bazinga futures."""
+
+from . import Exception as _Exception
+
+
+class NotDone(_Exception):
+    """The future is not done yet."""
+    pass
+
+
+class Future(object):
+    """The result of an operation that may not be finished yet.
+    Callbacks are called with the future once it is done, or right away if
+    it already is."""
+
+    def __init__(self):
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def __repr__(self):
+        if not self._done:
+            state = "pending"
+        elif self._exception is not None:
+            state = "failed with {0!r}".format(self._exception)
+        else:
+            state = "done with {0!r}".format(self._result)
+        return "<{0} {1} at 0x{2:x}>".format(self.__class__.__name__,
+                                             state, id(self))
+
+    def done(self):
+        """Return True if the operation is finished."""
+        return self._done
+
+    def result(self):
+        """Return the result of the operation, or raise its exception."""
+        if not self._done:
+            raise NotDone("This future is not done yet.")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self):
+        """Return the exception of the operation, or None."""
+        if not self._done:
+            raise NotDone("This future is not done yet.")
+        return self._exception
+
+    def _finish(self):
+        self._done = True
+        callbacks = self._callbacks
+        self._callbacks = None
+        for callback in callbacks:
+            callback(self)
+
+    def set_result(self, result):
+        """Finish the operation with result."""
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exception):
+        """Finish the operation with exception."""
+        self._exception = exception
+        self._finish()
+
+    def add_callback(self, callback):
+        """Call callback with the future once it is done."""
+        if self._done:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+        return self
+
+    def then(self, func):
+        """Return a future of func called with the result of this one.
+        Exceptions, of this future or raised by func, are passed along."""
+        future = Future()
+
+        def _chain(self):
+            if self._exception is not None:
+                future.set_exception(self._exception)
+                return
+            try:
+                result = func(self._result)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        self.add_callback(_chain)
+        return future
+
+    @classmethod
+    def from_call(cls, func, *args, **kw):
+        """Return a future done with the result or exception of a call."""
+        future = cls()
+        try:
+            result = func(*args, **kw)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        return future
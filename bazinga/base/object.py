@@ -1,21 +1,115 @@
 from . import signal as bsignal
 from singleton import SingletonPool
-import weakref
+from future import Future
+import collections
 
 class Notify(SingletonPool):
     """Notify signal.
     This is sent when an object see one of its attribute changed.
     On object[key] = value, Notify object is emitted on the object."""
 
-    _SingletonPool__instances = weakref.WeakValueDictionary()
+    # Attribute names are a small set: intern them for ever
+    _SingletonPool__instances = {}
+    _SingletonPool__key = ("attribute",)
 
     def __init__(self, attribute):
         self.attribute = attribute
 
+    def __repr__(self):
+        return "<{0} {1!r}>".format(self.__class__.__name__, self.attribute)
+
+
+# Objects with frozen notifications: id(object) -> [freeze count, pending keys]
+_frozen = {}
+
+# Notifications waiting for flush_notify(): (id(object), key) -> object
+_deferred = collections.OrderedDict()
+_deferring = False
+
+# (class, attribute) -> whether Notify(attribute) emitted by an instance of
+# class has receivers. Only valid for senders without receivers of their
+# own and for signal generation _notify_receivers_generation.
+_notify_receivers = {}
+_notify_receivers_generation = None
+
+
+def _has_notify_receivers(obj, key):
+    """Return True if a Notify for key emitted by obj may have receivers."""
+    global _notify_receivers_generation
+    if id(obj) in bsignal.dispatcher.connections:
+        return bsignal.has_receivers(obj, Notify(key))
+    if _notify_receivers_generation != bsignal.generation:
+        _notify_receivers.clear()
+        _notify_receivers_generation = bsignal.generation
+    try:
+        return _notify_receivers[(obj.__class__, key)]
+    except KeyError:
+        listened = _notify_receivers[(obj.__class__, key)] = \
+                bsignal.has_receivers(obj, Notify(key))
+        return listened
+
+
+def defer_notify(enabled=True):
+    """Enable or disable deferred notifications.
+    When enabled, Notify signals are not emitted right away but queued,
+    once per object and attribute, until flush_notify() is called.
+    The X connection calls it on each main loop iteration."""
+    global _deferring
+    _deferring = enabled
+    if not enabled:
+        flush_notify()
+
+
+def flush_notify():
+    """Emit all deferred Notify signals.
+    Notifications deferred while flushing are kept for the next flush."""
+    if _deferred:
+        pending = _deferred.items()
+        _deferred.clear()
+        for (obj_id, key), obj in pending:
+            bsignal.emit(Notify(key), obj)
+
+
+class _NotifyFreezer(object):
+    """Context manager thawing notifications of an object on exit."""
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __enter__(self):
+        return self.obj
+
+    def __exit__(self, type, value, traceback):
+        self.obj.thaw_notify()
+
+
+def _first_value(futures):
+    """Return a Future of the first non-empty result of futures, in order,
+    or of the last one. Failed futures count as empty."""
+    result = Future()
+
+    def _wait(index):
+        def _on_done(future):
+            if index + 1 < len(futures) \
+               and (future.exception() is not None or not future.result()):
+                _wait(index + 1)
+            elif future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                result.set_result(future.result())
+        futures[index].add_callback(_on_done)
+
+    _wait(0)
+    return result
+
 
 class Object(object):
     """Base class of many bazinga objects."""
 
+    # Properties computed from cached properties, by name: the first of
+    # them with a value is the value of the property, see fetch()
+    _fetch_aliases = {}
+
     def connect_signal(self, receiver, signal=bsignal.signal.All):
         """Connect a signal."""
         return bsignal.connect(receiver, signal=signal, sender=self)
@@ -65,16 +159,57 @@ class Object(object):
         super(Object, self).__delattr__(key)
         self.emit_notify(key)
 
+    def fetch(self, name):
+        """Return a Future of the cached property name, or of a property
+        of _fetch_aliases. See CachedProperty.fetch()."""
+        aliases = self._fetch_aliases.get(name)
+        if aliases is None:
+            return getattr(self.__class__, name).fetch(self)
+        # All requests are sent before waiting for any reply
+        return _first_value([ getattr(self.__class__, alias).fetch(self)
+                              for alias in aliases ])
+
     def connect_notify(self, receiver, key):
         """Connect a function to a Notify signal matching key."""
-        return self.connect_signal(receiver, Notify(key))
+        return bsignal.connect(receiver, signal=Notify(key), sender=self)
 
     def disconnect_notify(self, receiver, key):
         """Disconnect a function to a Notify signal matching key."""
-        return self.disconnect_signal(receiver, Notify(key))
+        return bsignal.disconnect(receiver, signal=Notify(key), sender=self)
 
     def emit_notify(self, key):
-        self.emit_signal(Notify(key))
+        if not _has_notify_receivers(self, key):
+            return
+        frozen = _frozen.get(id(self))
+        if frozen is not None:
+            frozen[1][key] = None
+        elif _deferring:
+            _deferred[(id(self), key)] = self
+        else:
+            bsignal.emit(Notify(key), self)
+
+    def freeze_notify(self):
+        """Stop emitting Notify signals until thaw_notify() is called.
+        Each changed attribute is notified once when thawing.
+        This returns a context manager calling thaw_notify() on exit:
+            with object.freeze_notify():
+                object.x = 1
+                object.y = 2"""
+        frozen = _frozen.get(id(self))
+        if frozen is None:
+            _frozen[id(self)] = [ 1, collections.OrderedDict() ]
+        else:
+            frozen[0] += 1
+        return _NotifyFreezer(self)
+
+    def thaw_notify(self):
+        """Emit Notify signals frozen by freeze_notify()."""
+        frozen = _frozen[id(self)]
+        frozen[0] -= 1
+        if frozen[0] == 0:
+            del _frozen[id(self)]
+            for key in frozen[1]:
+                self.emit_notify(key)
 
     def on_notify(self, key):
         """Return a function that can be called with a receiver as argument.
@@ -89,6 +224,7 @@ class Object(object):
     disconnect_class_notify = classmethod(disconnect_notify)
     emit_class_notify = classmethod(emit_notify)
 
+    @classmethod
     def on_class_notify(cls, key):
         """Return a function that can be called with a receiver as argument.
         This function will connect the receiver to the notify event matching that key.
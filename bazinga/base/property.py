@@ -1,10 +1,25 @@
 from object import Object
+from future import Future
 
 class CachedProperty(object):
-    """Cached Properties."""
-
-    def __init__(self, name, getter, setter, deleter, doc):
+    """Cached Properties.
+    Rather than a getter, a property fetched with an X request can define
+    a request function, sending the request and returning its cookie, and
+    a reply function, returning the value from the reply. This allows
+    fetching it for many objects at once with prefetch().
+    Properties storing an X property can name it with atom, so their cache
+    is dropped when the X property changes.
+    With a request function, fetch() returns a Future of the value instead
+    of waiting for the reply."""
+
+    def __init__(self, name, getter, setter, deleter, doc,
+                 request=None, reply=None, atom=None):
         self.name = name
+        self.atom = atom
+        self.request = request
+        self.reply = reply
+        if getter is None and request is not None:
+            getter = self._fetch
         self.getter = getter
         self.setter = setter
         self.deleter = deleter
@@ -44,15 +59,57 @@ class CachedProperty(object):
             ret = self.setter(inst, value)
             if ret:
                 value = ret
-        setattr(inst, self.key, value)
+        # Bypass Object.__setattr__: the attribute itself is notified
+        object.__setattr__(inst, self.key, value)
 
     def __delete__(self, inst):
         if self.deleter:
             self.deleter(inst)
         self.del_cache(inst)
 
+    def _fetch(self, inst):
+        return self.reply(inst, self.request(inst).reply())
+
+    def fetch(self, inst):
+        """Return a Future of the value of the property on inst.
+        The reply is waited for by the wait_for_reply() method of the inst
+        connection, and fills the cache. Cached values, and properties
+        without request function, are returned in a done future."""
+        if self.request is None or self.is_cached(inst):
+            return Future.from_call(self.__get__, inst, inst.__class__)
+
+        # Properties sharing a request wait for the same reply
+        fetches = getattr(inst, "_v_cached_property_fetches", None)
+        if fetches is None:
+            fetches = {}
+            object.__setattr__(inst, "_v_cached_property_fetches", fetches)
+        reply = fetches.get(self.request)
+        if reply is None:
+            reply = fetches[self.request] = \
+                    inst.connection.wait_for_reply(self.request(inst))
+            reply.add_callback(lambda future: fetches.pop(self.request, None))
+
+        def _on_reply(reply):
+            # Never call the getter here: it would wait for another reply
+            value = getattr(inst, self.key, self)
+            if value is self:
+                value = self.reply(inst, reply)
+                if value is None:
+                    # The reply function may have filled the cache itself
+                    value = getattr(inst, self.key, self)
+                    if value is self:
+                        raise AttributeError("Unable to fetch value for attribute '{0}' of '{1}'".format(self.name, inst))
+                else:
+                    self.set_cache(inst, value)
+            return value
+
+        return reply.then(_on_reply)
+
+    def is_cached(self, inst):
+        return getattr(inst, self.key, self) is not self
+
     def set_cache(self, inst, value):
-        setattr(inst, self.key, value)
+        object.__setattr__(inst, self.key, value)
         # Emit signal if object is a Bazinga Object
         if isinstance(inst, Object):
             inst.emit_notify(self.name)
@@ -60,7 +117,7 @@ class CachedProperty(object):
     def del_cache(self, inst):
         # Clear cache
         try:
-            delattr(inst, self.key)
+            object.__delattr__(inst, self.key)
         except AttributeError:
             pass
 
@@ -72,7 +129,10 @@ class CachedPropertyType(CachedProperty):
                                                         members.get('__get__'),
                                                         members.get('__set__'),
                                                         members.get('__delete__'),
-                                                        members.get('__doc__'))
+                                                        members.get('__doc__'),
+                                                        members.get('__request__'),
+                                                        members.get('__reply__'),
+                                                        members.get('atom'))
 
 
 cachedproperty = CachedPropertyType('cachedproperty')
@@ -92,6 +152,43 @@ class RoCachedPropertyType(CachedProperty):
                                                           members.get('__get__'),
                                                           _ro_setter,
                                                           _ro_deleter,
-                                                          members.get('__doc__'))
+                                                          members.get('__doc__'),
+                                                          members.get('__request__'),
+                                                          members.get('__reply__'),
+                                                          members.get('atom'))
 
 rocachedproperty = RoCachedPropertyType('rocachedproperty')
+
+
+def prefetch(instances, properties, ignore=()):
+    """Fill the cache of properties on all instances.
+    All requests are sent before waiting for any reply, and properties
+    sharing a request function are fetched with one request. Cached values
+    are not fetched again. If reading a reply raises an exception listed
+    in ignore, the matching caches stay empty."""
+    pending = []
+    for inst in instances:
+        requests = {}
+        for prop in properties:
+            if prop.request is None or prop.is_cached(inst):
+                continue
+            if prop.request in requests:
+                requests[prop.request][1].append(prop)
+            else:
+                requests[prop.request] = (prop.request(inst), [ prop ])
+        pending.extend((inst, cookie, props)
+                       for cookie, props in requests.itervalues())
+
+    for inst, cookie, props in pending:
+        try:
+            reply = cookie.reply()
+        except ignore:
+            continue
+        replied = set()
+        for prop in props:
+            if prop.reply in replied:
+                continue
+            replied.add(prop.reply)
+            value = prop.reply(inst, reply)
+            if value is not None:
+                prop.set_cache(inst, value)
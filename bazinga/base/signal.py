@@ -1,35 +1,226 @@
 """Bazinga signal system. This is a simple extension to Louie."""
 
 from louie import *
-from louie.dispatcher import live_receivers, get_receivers, plugins, sends
+from louie import dispatcher
+from louie.dispatcher import get_receivers, plugins, sends, WEAKREF_TYPES
+
+from singleton import SingletonPool
+
+import time
+
+
+# Resolved receivers, indexed by (sender class, signal class, signal or None).
+# Each value is (receivers connected on Any, receivers connected on the
+# sender classes, signals to look up for instance receivers).
+# This is cleared on every connection change.
+_receivers_cache = {}
+
+# Signals that have receivers connected on them, with connection count
+_connected_signals = {}
+
+# Bumped on every connection change, so callers can invalidate their caches
+generation = 0
+
+
+def _invalidate():
+    """Forget about resolved receivers."""
+    global generation
+    generation += 1
+    _receivers_cache.clear()
+
+
+def connect(receiver, signal=All, sender=Any, weak=True):
+    """Connect receiver to sender for signal."""
+    dispatcher.connect(receiver, signal, sender, weak)
+    _connected_signals[signal] = _connected_signals.get(signal, 0) + 1
+    _invalidate()
+
+
+def disconnect(receiver, signal=All, sender=Any, weak=True):
+    """Disconnect receiver from sender for signal."""
+    dispatcher.disconnect(receiver, signal, sender, weak)
+    count = _connected_signals.pop(signal, 1) - 1
+    if count > 0:
+        _connected_signals[signal] = count
+    _invalidate()
+
+
+def reset():
+    """Reset the state of the signal system."""
+    dispatcher.reset()
+    _connected_signals.clear()
+    _invalidate()
+
+
+# Dispatch statistics while profiling, as (signal stats, receiver stats),
+# see profile()
+_profile = None
+
+# Statistics of the last profile() run
+_last_profile = [ {}, {} ]
+
+
+def profile(enabled=True):
+    """Start or stop recording dispatch statistics.
+    Starting clears previous statistics, stopping keeps them readable."""
+    global _profile
+    if enabled:
+        _profile = ({}, {})
+    elif _profile is not None:
+        _last_profile[:] = _profile
+        _profile = None
+
+
+def _receiver_name(receiver):
+    """Return a readable name for receiver."""
+    func = getattr(receiver, "im_func", receiver)
+    name = getattr(func, "__name__", None) or repr(func)
+    owner = getattr(receiver, "im_class", None)
+    if owner is not None:
+        name = "{0}.{1}".format(owner.__name__, name)
+    module = getattr(func, "__module__", None)
+    if module:
+        name = "{0}.{1}".format(module, name)
+    return name
+
+
+def _signal_name(signal):
+    if isinstance(signal, type):
+        return signal.__name__
+    return repr(signal)
+
+
+def _record(stats, key, elapsed, fanout=0):
+    """Add a call of elapsed seconds to stats of key."""
+    entry = stats.get(key)
+    if entry is None:
+        entry = stats[key] = [ 0, 0.0, 0.0, 0 ]
+    entry[0] += 1
+    entry[1] += elapsed
+    if elapsed > entry[2]:
+        entry[2] = elapsed
+    entry[3] += fanout
+
+
+def get_profile():
+    """Return dispatch statistics of the current or last profile() run.
+    This is a dict with:
+        * "signals": (sender class name, signal name) -> stats, with the
+          number of receivers called as "fanout". Strings and interned
+          signals like Notify are named by their repr, other signals by
+          their type;
+        * "receivers": receiver name -> stats.
+    Stats are dicts of "count", "total" and "max" time in seconds."""
+    signals, receivers = _profile or _last_profile
+    return {
+        "signals": dict(((sender.__name__, _signal_name(signal)),
+                         { "count": entry[0],
+                           "total": entry[1],
+                           "max": entry[2],
+                           "fanout": entry[3] })
+                        for (sender, signal), entry in signals.iteritems()),
+        "receivers": dict((name, { "count": entry[0],
+                                   "total": entry[1],
+                                   "max": entry[2] })
+                          for name, entry in receivers.iteritems()),
+    }
+
+
+def dump_profile(output):
+    """Write dispatch statistics to output, a file name or a file, sorted
+    by total time."""
+    if isinstance(output, basestring):
+        with open(output, "w") as f:
+            return dump_profile(f)
+    stats = get_profile()
+    output.write("{0:<50} {1:>8} {2:>10} {3:>10} {4:>8}\n".format(
+        "signal", "count", "total (s)", "max (ms)", "fanout"))
+    for (sender, signal), entry in sorted(stats["signals"].iteritems(),
+                                          key=lambda item: -item[1]["total"]):
+        output.write("{0:<50} {1:>8} {2:>10.4f} {3:>10.3f} {4:>8.1f}\n".format(
+            "{0} {1}".format(sender, signal),
+            entry["count"], entry["total"], entry["max"] * 1000,
+            float(entry["fanout"]) / entry["count"]))
+    output.write("\n{0:<50} {1:>8} {2:>10} {3:>10}\n".format(
+        "receiver", "count", "total (s)", "max (ms)"))
+    for name, entry in sorted(stats["receivers"].iteritems(),
+                              key=lambda item: -item[1]["total"]):
+        output.write("{0:<50} {1:>8} {2:>10.4f} {3:>10.3f}\n".format(
+            name, entry["count"], entry["total"], entry["max"] * 1000))
+
+
+def _extend_unique(result, yielded, receivers):
+    """Append receivers not yet in yielded to result."""
+    for receiver in receivers:
+        if receiver: # filter out dead instance-method weakrefs
+            try:
+                if not receiver in yielded:
+                    yielded.add(receiver)
+                    result.append(receiver)
+            except TypeError:
+                # dead weakrefs raise TypeError on hash...
+                pass
+
+
+def _resolve_receivers(sender, signal):
+    """Resolve receivers connected on Any and on the sender MRO for signal
+    and its MRO. Receivers connected on sender itself are not resolved."""
+    signals = [ All ]
+    if signal in _connected_signals:
+        signals.append(signal)
+    signals.extend(signal.__class__.__mro__)
+
+    yielded = set()
+    any_receivers = []
+    for signal_iter in signals:
+        _extend_unique(any_receivers, yielded, get_receivers(Any, signal_iter))
+    class_receivers = []
+    for sender_iter in sender.__class__.__mro__:
+        for signal_iter in signals:
+            _extend_unique(class_receivers, yielded,
+                           get_receivers(sender_iter, signal_iter))
+
+    return any_receivers, class_receivers, signals
 
 
 def _get_all_receivers_mro(sender=Any, signal=All):
     """Get list of all receivers from global tables.
 
     This gets all receivers which should receive the given signal from
-    sender, each receiver should be produced only once by the
-    resulting generator.
+    sender, each receiver should be produced only once in the
+    resulting list.
 
     This also returns receivers matchin the sender and signal MRO.
+    Receivers connected on classes are resolved once and cached, only the
+    receivers connected on sender itself are looked up on each call.
     """
-    yielded = set()
-    _receivers = []
+    if signal in _connected_signals:
+        key = (sender.__class__, signal.__class__, signal)
+    else:
+        key = (sender.__class__, signal.__class__, None)
+
+    try:
+        any_receivers, class_receivers, signals = _receivers_cache[key]
+    except KeyError:
+        any_receivers, class_receivers, signals = _receivers_cache[key] = \
+                _resolve_receivers(sender, signal)
+
+    sender_signals = dispatcher.connections.get(id(sender))
+    if not sender_signals:
+        return any_receivers + class_receivers
+
+    receivers = list(any_receivers)
+    yielded = set(any_receivers)
+    for signal_iter in signals:
+        if signal_iter in sender_signals:
+            _extend_unique(receivers, yielded, sender_signals[signal_iter])
+    _extend_unique(receivers, yielded, class_receivers)
+    return receivers
 
-    for sender_iter in [ Any, sender ] + list(sender.__class__.__mro__):
-        for signal_iter in [ All, signal ] + list(signal.__class__.__mro__):
-            _receivers.append(get_receivers(sender_iter, signal_iter))
 
-    for receivers in _receivers:
-        for receiver in receivers:
-            if receiver: # filter out dead instance-method weakrefs
-                try:
-                    if not receiver in yielded:
-                        yielded.add(receiver)
-                        yield receiver
-                except TypeError:
-                    # dead weakrefs raise TypeError on hash...
-                    pass
+def has_receivers(sender, signal):
+    """Return True if emitting signal from sender may call receivers."""
+    return bool(_get_all_receivers_mro(sender, signal))
 
 
 def emit(signal=signal.All, sender=sender.Anonymous, *arguments, **named):
@@ -38,11 +229,31 @@ def emit(signal=signal.All, sender=sender.Anonymous, *arguments, **named):
     # Call each receiver with whatever arguments it can accept.
     # Return a list of tuple pairs [(receiver, response), ... ].
     responses = []
-    for receiver in live_receivers(_get_all_receivers_mro(sender, signal)):
+    profiling = _profile
+    if profiling is not None:
+        emit_start = time.time()
+    for receiver in _get_all_receivers_mro(sender, signal):
+        if isinstance(receiver, WEAKREF_TYPES):
+            # Dereference the weak reference.
+            receiver = receiver()
+            if receiver is None:
+                # Louie cleaned it up, forget about resolved receivers
+                _invalidate()
+                continue
+        if plugins:
+            live = True
+            for plugin in plugins:
+                if not plugin.is_live(receiver):
+                    live = False
+                    break
+            if not live:
+                continue
         # Wrap receiver using installed plugins.
         original = receiver
         for plugin in plugins:
             receiver = plugin.wrap_receiver(receiver)
+        if profiling is not None:
+            receiver_start = time.time()
         # XXX make it robust?
         response = robustapply.robust_apply(
             receiver, original,
@@ -51,7 +262,18 @@ def emit(signal=signal.All, sender=sender.Anonymous, *arguments, **named):
             *arguments,
             **named
             )
+        if profiling is not None:
+            _record(profiling[1], _receiver_name(original),
+                    time.time() - receiver_start)
         responses.append((receiver, response))
+    if profiling is not None:
+        if not isinstance(sender, type):
+            sender = sender.__class__
+        # Interned signals are kept apart, events are counted by type
+        if not isinstance(signal, (type, basestring, SingletonPool)):
+            signal = signal.__class__
+        _record(profiling[0], (sender, signal),
+                time.time() - emit_start, len(responses))
     # Update stats.
     if __debug__:
         global sends
@@ -1,4 +1,5 @@
 import cPickle
+import inspect
 
 class SingletonMeta(type):
     """Singleton metaclass."""
@@ -17,34 +18,97 @@ class Singleton(object):
     __metaclass__ = SingletonMeta
 
 
+# Tags the keys built from all the arguments, so they never collide with a
+# value returned by a __key function
+_ALL_ARGUMENTS = object()
+
+
+def _make_pool_key(cls, names):
+    """Build a function returning the pool key of a call to cls from the
+    values of the constructor arguments names.
+    The key is the value itself when there is only one name."""
+    argnames, varargs, varkw, defaults = inspect.getargspec(cls.__init__)
+    argnames = argnames[1:]
+    defaults = dict(zip(argnames[len(argnames) - len(defaults or ()):],
+                        defaults or ()))
+    positions = [ (name, argnames.index(name)) for name in names ]
+
+    def _get_value(args, kwargs, name, position):
+        if position < len(args):
+            return args[position]
+        try:
+            return kwargs[name]
+        except KeyError:
+            return defaults[name]
+
+    if len(positions) == 1:
+        name, position = positions[0]
+        def pool_key(args, kwargs):
+            return _get_value(args, kwargs, name, position)
+    else:
+        def pool_key(args, kwargs):
+            return tuple([ _get_value(args, kwargs, name, position)
+                           for name, position in positions ])
+
+    return pool_key
+
+
 class SingletonPoolMeta(type):
     """Singleton pool metaclass."""
 
+    def __init__(cls, name, bases, members):
+        super(SingletonPoolMeta, cls).__init__(name, bases, members)
+        names = getattr(cls, "_SingletonPool__key", None)
+        if names:
+            cls._SingletonPool__keyfunc = staticmethod(_make_pool_key(cls, names))
+
     def __call__(cls, *args, **kwargs):
-        try:
-            key = cls.__getpool__(*args, **kwargs)
-            return key
-        except:
+        obj = cls.__getpool__(*args, **kwargs)
+        if obj is None:
             obj = type.__call__(cls, *args, **kwargs)
             cls.__setpool__(obj, *args, **kwargs)
-            return obj
+        return obj
 
 
 class SingletonPool(object):
 
     """Pool of singleton object.
     When using multiple inheritance, it's very advised to start to inherit
-    with this class, because it's use of a metaclass overriding __call__."""
+    with this class, because it's use of a metaclass overriding __call__.
+
+    Subclasses can declare the constructor arguments identifying an object
+    with a __key tuple of argument names. With only one name, the argument
+    value itself is the key, so a plain dict pool is an interning table.
+    Otherwise all arguments are used. Unhashable arguments are pickled."""
 
     __metaclass__ = SingletonPoolMeta
 
-    @staticmethod
-    def __getpoolkey__(*args, **kwargs):
-        return cPickle.dumps((args, kwargs))
+    __key = None
+    __keyfunc = None
+
+    @classmethod
+    def __getpoolkey__(cls, *args, **kwargs):
+        key = None
+        if cls.__keyfunc:
+            try:
+                key = cls.__keyfunc(args, kwargs)
+            except (IndexError, KeyError):
+                # Missing arguments, let the constructor complain
+                pass
+        if key is None:
+            if kwargs:
+                key = (_ALL_ARGUMENTS, args, tuple(sorted(kwargs.iteritems())))
+            else:
+                key = (_ALL_ARGUMENTS, args)
+        try:
+            hash(key)
+        except TypeError:
+            return (_ALL_ARGUMENTS, cPickle.dumps((args, kwargs)))
+        return key
 
     @classmethod
     def __getpool__(cls, *args, **kwargs):
-        return cls.__instances[cls.__getpoolkey__(*args, **kwargs)]
+        return cls.__instances.get(cls.__getpoolkey__(*args, **kwargs))
 
     @classmethod
     def __setpool__(cls, obj, *args, **kwargs):
@@ -1,10 +1,224 @@
+import xcb
 import xcb.xproto
+import collections
 import weakref
 
+import base
 from base.object import Object
 from base.property import rocachedproperty
 from base.singleton import SingletonPool
 
+
+# Built-in color names, in rgb.txt format: red green blue name
+# grayN and greyN, for N from 0 to 100, are added by _parse_rgb_txt().
+_rgb_txt = """
+255 250 250		snow
+248 248 255		GhostWhite
+245 245 245		WhiteSmoke
+220 220 220		gainsboro
+255 250 240		FloralWhite
+253 245 230		OldLace
+250 240 230		linen
+250 235 215		AntiqueWhite
+255 239 213		PapayaWhip
+255 235 205		BlanchedAlmond
+255 228 196		bisque
+255 218 185		PeachPuff
+255 222 173		NavajoWhite
+255 228 181		moccasin
+255 248 220		cornsilk
+255 255 240		ivory
+255 250 205		LemonChiffon
+255 245 238		seashell
+240 255 240		honeydew
+245 255 250		MintCream
+240 255 255		azure
+240 248 255		AliceBlue
+230 230 250		lavender
+255 240 245		LavenderBlush
+255 228 225		MistyRose
+255 255 255		white
+  0   0   0		black
+ 47  79  79		DarkSlateGray
+ 47  79  79		DarkSlateGrey
+105 105 105		DimGray
+105 105 105		DimGrey
+112 128 144		SlateGray
+112 128 144		SlateGrey
+119 136 153		LightSlateGray
+119 136 153		LightSlateGrey
+190 190 190		gray
+190 190 190		grey
+211 211 211		LightGrey
+211 211 211		LightGray
+ 25  25 112		MidnightBlue
+  0   0 128		navy
+  0   0 128		NavyBlue
+100 149 237		CornflowerBlue
+ 72  61 139		DarkSlateBlue
+106  90 205		SlateBlue
+123 104 238		MediumSlateBlue
+132 112 255		LightSlateBlue
+  0   0 205		MediumBlue
+ 65 105 225		RoyalBlue
+  0   0 255		blue
+ 30 144 255		DodgerBlue
+  0 191 255		DeepSkyBlue
+135 206 235		SkyBlue
+135 206 250		LightSkyBlue
+ 70 130 180		SteelBlue
+176 196 222		LightSteelBlue
+173 216 230		LightBlue
+176 224 230		PowderBlue
+175 238 238		PaleTurquoise
+  0 206 209		DarkTurquoise
+ 72 209 204		MediumTurquoise
+ 64 224 208		turquoise
+  0 255 255		cyan
+224 255 255		LightCyan
+ 95 158 160		CadetBlue
+102 205 170		MediumAquamarine
+127 255 212		aquamarine
+  0 100   0		DarkGreen
+ 85 107  47		DarkOliveGreen
+143 188 143		DarkSeaGreen
+ 46 139  87		SeaGreen
+ 60 179 113		MediumSeaGreen
+ 32 178 170		LightSeaGreen
+152 251 152		PaleGreen
+  0 255 127		SpringGreen
+124 252   0		LawnGreen
+  0 255   0		green
+127 255   0		chartreuse
+  0 250 154		MediumSpringGreen
+173 255  47		GreenYellow
+ 50 205  50		LimeGreen
+154 205  50		YellowGreen
+ 34 139  34		ForestGreen
+107 142  35		OliveDrab
+189 183 107		DarkKhaki
+240 230 140		khaki
+238 232 170		PaleGoldenrod
+250 250 210		LightGoldenrodYellow
+255 255 224		LightYellow
+255 255   0		yellow
+255 215   0		gold
+238 221 130		LightGoldenrod
+218 165  32		goldenrod
+184 134  11		DarkGoldenrod
+188 143 143		RosyBrown
+205  92  92		IndianRed
+139  69  19		SaddleBrown
+160  82  45		sienna
+205 133  63		peru
+222 184 135		burlywood
+245 245 220		beige
+245 222 179		wheat
+244 164  96		SandyBrown
+210 180 140		tan
+210 105  30		chocolate
+178  34  34		firebrick
+165  42  42		brown
+233 150 122		DarkSalmon
+250 128 114		salmon
+255 160 122		LightSalmon
+255 165   0		orange
+255 140   0		DarkOrange
+255 127  80		coral
+240 128 128		LightCoral
+255  99  71		tomato
+255  69   0		OrangeRed
+255   0   0		red
+255 105 180		HotPink
+255  20 147		DeepPink
+255 192 203		pink
+255 182 193		LightPink
+219 112 147		PaleVioletRed
+176  48  96		maroon
+199  21 133		MediumVioletRed
+208  32 144		VioletRed
+255   0 255		magenta
+238 130 238		violet
+221 160 221		plum
+218 112 214		orchid
+186  85 211		MediumOrchid
+153  50 204		DarkOrchid
+148   0 211		DarkViolet
+138  43 226		BlueViolet
+160  32 240		purple
+147 112 219		MediumPurple
+216 191 216		thistle
+215   7  81		DebianRed
+169 169 169		DarkGrey
+169 169 169		DarkGray
+  0   0 139		DarkBlue
+  0 139 139		DarkCyan
+139   0 139		DarkMagenta
+139   0   0		DarkRed
+144 238 144		LightGreen
+"""
+
+
+def _normalize_color_name(name):
+    """Normalize a color name as the X server does."""
+    return name.replace(" ", "").lower()
+
+
+def _parse_rgb_txt(text):
+    """Return a color name: (red, green, blue) dict from rgb.txt content.
+    Values are 16 bits."""
+    colors = {}
+    for line in text.splitlines():
+        fields = line.split(None, 3)
+        if len(fields) == 4 and not line.startswith("!"):
+            colors[_normalize_color_name(fields[3])] = \
+                    tuple([ int(value) * 257 for value in fields[:3] ])
+    for percent in xrange(101):
+        # Rounded as in the X server rgb.txt
+        value = int(percent * 2.55 + 0.5) * 257
+        colors["gray{0}".format(percent)] = (value, value, value)
+        colors["grey{0}".format(percent)] = (value, value, value)
+    return colors
+
+
+_rgb_names = _parse_rgb_txt(_rgb_txt)
+
+
+def _truecolor_masks(connection, colormap):
+    """Return (red mask, green mask, blue mask) of colormap if it is the
+    default colormap of a screen with a TrueColor visual, or None.
+    Pixel values for such a colormap can be computed without request."""
+    colormaps = connection._truecolor_colormaps
+    if colormaps is None:
+        colormaps = connection._truecolor_colormaps = {}
+        for root in connection.get_setup().roots:
+            for depth in root.allowed_depths:
+                for visual in depth.visuals:
+                    if visual.visual_id == root.root_visual \
+                       and visual._class == xcb.xproto.VisualClass.TrueColor:
+                        colormaps[root.default_colormap] = (visual.red_mask,
+                                                            visual.green_mask,
+                                                            visual.blue_mask)
+    return colormaps.get(colormap)
+
+
+def _truecolor_pixel(masks, red, green, blue):
+    """Return the pixel of a 16 bits red, green, blue color for a TrueColor
+    visual, and the red, green and blue values it displays."""
+    pixel = 0
+    values = []
+    for value, mask in zip((red, green, blue), masks):
+        shift = 0
+        while mask and not mask & 1:
+            mask >>= 1
+            shift += 1
+        bits = bin(mask).count("1")
+        scaled = value >> (16 - bits)
+        pixel |= scaled << shift
+        values.append(scaled * 65535 // ((1 << bits) - 1))
+    return pixel, values
+
+
 class XColor(Object):
     """Generic color class."""
 
@@ -46,7 +260,19 @@ class XColor(Object):
         return self.name
 
 
-class NamedColor(XColor):
+class BadColor(base.Exception):
+    """Some colors could not be allocated.
+    failed holds their specifications, and colors the allocated colors,
+    with None for the failed ones."""
+
+    def __init__(self, failed, colors):
+        super(BadColor, self).__init__(
+            "Unable to allocate colors: {0}".format(", ".join(map(str, failed))))
+        self.failed = failed
+        self.colors = colors
+
+
+class NamedColor(XColor, SingletonPool):
     """A named color."""
 
     _SingletonPool__instances = {}
@@ -58,19 +284,38 @@ class NamedColor(XColor):
     class name(rocachedproperty):
         __doc__  = XColor.name.__doc__
 
-    def __init__(self, connection, colormap, name, alpha=65535):
+    @staticmethod
+    def _request(connection, colormap, name, alpha=65535):
+        """Send the request allocating the color.
+        Return its cookie, or None if the color is computed locally."""
         if alpha < 0 or alpha > 65535:
             raise ValueError("Bad alpha value.")
+        if _normalize_color_name(name) in _rgb_names \
+           and _truecolor_masks(connection, colormap):
+            return None
+        return connection.core.AllocNamedColor(colormap, len(name), name)
+
+    def __init__(self, connection, colormap, name, alpha=65535):
+        cookie = self._request(connection, colormap, name, alpha)
+        self._setup(connection, colormap, name, alpha,
+                    cookie and cookie.reply())
 
-        cookie = connection.core.AllocNamedColor(colormap, len(name), name)
+    def _setup(self, connection, colormap, name, alpha, reply):
         NamedColor.name.set_cache(self, name)
         NamedColor.alpha.set_cache(self, alpha)
 
-        reply = cookie.reply()
-        NamedColor.red.set_cache(self, reply.exact_red)
-        NamedColor.green.set_cache(self, reply.exact_green)
-        NamedColor.blue.set_cache(self, reply.exact_blue)
-        NamedColor.pixel.set_cache(self, reply.pixel)
+        if reply is None:
+            rgb = _rgb_names[_normalize_color_name(name)]
+            pixel = _truecolor_pixel(_truecolor_masks(connection, colormap), *rgb)[0]
+            NamedColor.red.set_cache(self, rgb[0])
+            NamedColor.green.set_cache(self, rgb[1])
+            NamedColor.blue.set_cache(self, rgb[2])
+            NamedColor.pixel.set_cache(self, pixel)
+        else:
+            NamedColor.red.set_cache(self, reply.exact_red)
+            NamedColor.green.set_cache(self, reply.exact_green)
+            NamedColor.blue.set_cache(self, reply.exact_blue)
+            NamedColor.pixel.set_cache(self, reply.pixel)
 
         super(NamedColor, self).__init__(connection)
 
@@ -84,42 +329,115 @@ class ValueColor(XColor, SingletonPool):
     def __getpoolkey__(connection, colormap, red=0, green=0, blue=0, alpha=65535):
         return (id(connection), colormap, red, green, blue, alpha)
 
-    def __init__(self, connection, colormap, red=0, green=0, blue=0, alpha=65535):
-
+    @staticmethod
+    def _request(connection, colormap, red=0, green=0, blue=0, alpha=65535):
+        """Send the request allocating the color.
+        Return its cookie, or None if the color is computed locally."""
         for value in [ red, blue, green, alpha ]:
             if value < 0 or value > 65535:
                 raise ValueError("Color attribute value is too high.")
+        if _truecolor_masks(connection, colormap):
+            return None
+        return connection.core.AllocColor(colormap, red, green, blue)
+
+    def __init__(self, connection, colormap, red=0, green=0, blue=0, alpha=65535):
+        cookie = self._request(connection, colormap, red, green, blue, alpha)
+        self._setup(connection, colormap, red, green, blue, alpha,
+                    cookie and cookie.reply())
 
-        cookie = connection.core.AllocColor(colormap, red, green, blue)
+    def _setup(self, connection, colormap, red, green, blue, alpha, reply):
         ValueColor.alpha.set_cache(self, alpha)
 
-        reply = cookie.reply()
-        ValueColor.red.set_cache(self, reply.red)
-        ValueColor.green.set_cache(self, reply.green)
-        ValueColor.blue.set_cache(self, reply.blue)
-        ValueColor.pixel.set_cache(self, reply.pixel)
+        if reply is None:
+            pixel, values = _truecolor_pixel(_truecolor_masks(connection, colormap),
+                                             red, green, blue)
+            ValueColor.red.set_cache(self, values[0])
+            ValueColor.green.set_cache(self, values[1])
+            ValueColor.blue.set_cache(self, values[2])
+            ValueColor.pixel.set_cache(self, pixel)
+        else:
+            ValueColor.red.set_cache(self, reply.red)
+            ValueColor.green.set_cache(self, reply.green)
+            ValueColor.blue.set_cache(self, reply.blue)
+            ValueColor.pixel.set_cache(self, reply.pixel)
 
         super(ValueColor, self).__init__(connection)
 
 
+def _parse_color(color, alpha=65535):
+    """Return the color class and its arguments for a color name."""
+    if not color:
+        raise ValueError("Empty color name.")
+    if color[0] == '#':
+        len_name = len(color)
+
+        if len_name != 7 and len_name != 9:
+            raise ValueError("Bad color name {0}.".format(color))
+
+        red = int(color[1:3], 16) * 257
+        green = int(color[3:5], 16) * 257
+        blue = int(color[5:7], 16) * 257
+
+        if len_name == 9:
+            alpha = int(color[7:9], 16) * 257
+
+        return ValueColor, (red, green, blue, alpha)
+    return NamedColor, (color, alpha)
+
+
 def Color(connection, colormap, color=None, red=0, green=0, blue=0, alpha=65535):
     """Create a color. You should specify name, or RGBA values."""
     if color:
         # Already color type :-)
         if isinstance(color, XColor):
             return color
-        elif color[0] == '#':
-            len_name = len(color)
+        cls, args = _parse_color(color, alpha)
+        return cls(connection, colormap, *args)
+    return ValueColor(connection, colormap, red, green, blue, alpha)
 
-            if len_name != 7 and len_name != 9:
-                raise ValueError("Bad color name {0}.".format(color))
 
-            red = int(color[2:4], 16) * 257
-            green = int(color[4:6], 16) * 257
-            blue = int(color[6:8], 16) * 257
+def allocate_many(connection, colormap, colors):
+    """Create many colors at once, returning them in a list.
+    All allocation requests are sent before waiting for any reply.
+    If some colors can not be allocated, BadColor is raised once all the
+    others are.
+    This is also available as Color.allocate_many()."""
+    result = [ None ] * len(colors)
+    failed = []
+    # (class, arguments): (cookie, indexes in result)
+    pending = collections.OrderedDict()
 
-            if len_name == 9:
-                alpha = int(color[8:10], 16) * 257
+    for index, color in enumerate(colors):
+        if isinstance(color, XColor):
+            result[index] = color
+            continue
+        try:
+            cls, args = _parse_color(color)
+            obj = cls.__getpool__(connection, colormap, *args)
+            if obj is None and (cls, args) not in pending:
+                pending[(cls, args)] = (cls._request(connection, colormap, *args), [])
+        except ValueError:
+            failed.append(color)
+            continue
+        if obj is None:
+            pending[(cls, args)][1].append(index)
         else:
-            return NamedColor(connection, colormap, color, alpha)
-    return ValueColor(connection, colormap, red, green, blue, alpha)
+            result[index] = obj
+
+    for (cls, args), (cookie, indexes) in pending.iteritems():
+        try:
+            reply = cookie and cookie.reply()
+        except xcb.ProtocolException:
+            failed.extend([ colors[index] for index in indexes ])
+            continue
+        obj = cls.__new__(cls)
+        obj._setup(connection, colormap, *(args + (reply,)))
+        cls.__setpool__(obj, connection, colormap, *args)
+        for index in indexes:
+            result[index] = obj
+
+    if failed:
+        raise BadColor(failed, result)
+    return result
+
+Color.allocate_many = allocate_many
@@ -87,17 +87,17 @@ _name_to_id = {
 }
 
 
-# XXX make font an X object
-#_fonts = weakref.WeakValueDictionary()
-_font = None
-
-
 class XCursor(XObject):
-    """A X cursor."""
+    """A X cursor.
+    Cursors are pooled per connection by name and colors."""
 
     # This is defined in some X header file…
     _font_name = "cursor"
-    _font = None
+
+    # Cursors created by prewarm() when no name is given
+    common_cursors = ("left_ptr", "fleur", "sizing", "watch", "xterm",
+                      "top_left_corner", "top_right_corner",
+                      "bottom_left_corner", "bottom_right_corner")
 
 
     class foreground(cachedproperty):
@@ -109,14 +109,18 @@ class XCursor(XObject):
             raise AttributeError
 
         def __set__(self, value):
+            # Other users of the pooled cursor keep their colors
+            self._unpool()
             color = Color(self.connection, self.colormap, value)
-            self.connection.core.RecolorCursorChecked(self,
-                                                      color.red,
-                                                      color.green,
-                                                      color.blue,
-                                                      self.background.red,
-                                                      self.background.green,
-                                                      self.background.blue).check()
+            self.connection.void_request("RecolorCursor",
+                                         (self,
+                                          color.red,
+                                          color.green,
+                                          color.blue,
+                                          self.background.red,
+                                          self.background.green,
+                                          self.background.blue),
+                                         self)
             return color
 
     class background(cachedproperty):
@@ -128,56 +132,95 @@ class XCursor(XObject):
             raise AttributeError
 
         def __set__(self, value):
+            # Other users of the pooled cursor keep their colors
+            self._unpool()
             color = Color(self.connection, self.colormap, value)
-            self.connection.core.RecolorCursorChecked(self,
-                                                      self.foreground.red,
-                                                      self.foreground.green,
-                                                      self.foreground.blue,
-                                                      color.red,
-                                                      color.green,
-                                                      color.blue).check()
+            self.connection.void_request("RecolorCursor",
+                                         (self,
+                                          self.foreground.red,
+                                          self.foreground.green,
+                                          self.foreground.blue,
+                                          color.red,
+                                          color.green,
+                                          color.blue),
+                                         self)
 
             return color
 
+    @classmethod
+    def _get_font(cls, connection):
+        """Return the cursor font of a connection, opening it if needed."""
+        # XXX make font an X object
+        if connection._cursor_font is None:
+            connection._cursor_font = connection.generate_id()
+            connection.core.OpenFont(connection._cursor_font,
+                                     len(cls._font_name), cls._font_name)
+        return connection._cursor_font
+
+    def _unpool(self):
+        """Remove the cursor from its connection pool."""
+        for key, cursor in self.connection._cursors.items():
+            if cursor is self:
+                del self.connection._cursors[key]
+
     @classmethod
     def create(cls, connection, colormap, value, foreground="black", background="white"):
+        """Return a cursor from its name and colors.
+        Cursors are created once per connection, without waiting for the
+        server: errors are sent as Connection.RequestError on the cursor.
+        Only the red, green and blue values of the colors are used, so
+        colormap can be None to use the default colormap of the first
+        screen."""
         if isinstance(value, XCursor):
             return value
 
-        # Initialize font is never done before
-        if cls._font is None:
-            cls._font = connection.generate_id()
-            connection.core.OpenFont(cls._font, len(cls._font_name), cls._font_name)
+        key = (cls, value, foreground, background)
+        cursor = connection._cursors.get(key)
+        if cursor is not None:
+            return cursor
 
         try:
             cursor_id = _name_to_id[value]
         except KeyError:
             raise ValueError("No such cursor.")
 
+        if colormap is None:
+            colormap = connection.get_setup().roots[0].default_colormap
+
+        font = cls._get_font(connection)
+
         cursor = super(XCursor, cls).create(connection)
 
         foreground = Color(connection, colormap, foreground)
         background = Color(connection, colormap, background)
 
-        cg = cursor.connection.core.CreateGlyphCursorChecked(cursor,
-                                                             cls._font, cls._font,
-                                                             cursor_id, cursor_id + 1,
-                                                             foreground.red,
-                                                             foreground.green,
-                                                             foreground.blue,
-                                                             background.red,
-                                                             background.green,
-                                                             background.blue)
+        cursor.connection.void_request("CreateGlyphCursor",
+                                       (cursor,
+                                        font, font,
+                                        cursor_id, cursor_id + 1,
+                                        foreground.red,
+                                        foreground.green,
+                                        foreground.blue,
+                                        background.red,
+                                        background.green,
+                                        background.blue),
+                                       cursor)
 
         Cursor.foreground.set_cache(cursor, foreground)
         Cursor.background.set_cache(cursor, background)
         cursor.name = value
         cursor.colormap = colormap
 
-        cg.check()
+        connection._cursors[key] = cursor
 
         return cursor
 
+    @classmethod
+    def prewarm(cls, connection, names=None, foreground="black", background="white"):
+        """Create cursors in advance, common_cursors by default."""
+        for name in names or cls.common_cursors:
+            cls.create(connection, None, name, foreground, background)
+
     def __str__(self):
         return self.name
 
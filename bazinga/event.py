@@ -21,6 +21,8 @@ class Event(object):
 
 
 class KeyButton(Event):
+    _SingletonPool__key = ("state", "detail")
+
     def __init__(self, state, detail):
         self.state = state
         self.detail = detail
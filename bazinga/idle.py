@@ -0,0 +1,150 @@
+"""Bazinga idle work queue."""
+
+from base.object import Object
+from loop import MainLoop
+
+import heapq
+import itertools
+import time
+import traceback
+import types
+
+
+class Job(object):
+    """A function queued in an IdleQueue."""
+
+    def __init__(self, queue, func, args, kw, priority):
+        self.queue = queue
+        self.func = func
+        self.args = args
+        self.kw = kw
+        self.priority = priority
+        self.queued = time.time()
+        self.generator = None
+        self.cancelled = False
+        self.done = False
+        # True while a slice of the job runs
+        self.running = False
+
+    def __repr__(self):
+        return "<{0} {1!r} priority {2} at 0x{3:x}>".format(self.__class__.__name__,
+                                                           self.func,
+                                                           self.priority,
+                                                           id(self))
+
+    def cancel(self):
+        """Do not run this job, or the rest of it."""
+        if not self.cancelled and not self.done:
+            self.cancelled = True
+            # A running generator cannot be closed: the queue closes it
+            # once its slice returns.
+            if self.generator is not None and not self.running:
+                self.generator.close()
+            self.queue._on_cancel(self)
+
+    def _step(self):
+        """Run the job, or its next slice. Return True if it is finished."""
+        self.running = True
+        try:
+            if self.generator is None:
+                result = self.func(*self.args, **self.kw)
+                if not isinstance(result, types.GeneratorType):
+                    return True
+                self.generator = result
+            try:
+                self.generator.next()
+            except StopIteration:
+                return True
+            return False
+        finally:
+            self.running = False
+
+
+class IdleQueue(Object):
+    """Work run when the loop has nothing else to do.
+    Jobs with the lowest priority number run first, then in queue order.
+    A job returning a generator is run one step at a time, so long work
+    can be sliced with yield. Each loop iteration runs jobs until budget
+    seconds are spent, and input is handled between iterations."""
+
+    # Seconds of work per loop iteration
+    budget = 0.005
+
+    def __init__(self, loop):
+        self.loop = loop
+        # (priority, order, job)
+        self._heap = []
+        self._order = itertools.count()
+        self._watcher = loop.watch_idle(self._on_idle)
+        # Number of jobs neither done nor cancelled
+        self.depth = 0
+        self.stats = { "done": 0,
+                       "cancelled": 0,
+                       "slices": 0,
+                       # Time between queueing and the first run
+                       "total_latency": 0.0,
+                       "max_latency": 0.0 }
+
+    @classmethod
+    def get(cls, loop=None):
+        """Return the idle queue of loop, the main loop by default."""
+        if loop is None:
+            loop = MainLoop()
+        try:
+            return loop._idle_queue
+        except AttributeError:
+            queue = loop._idle_queue = cls(loop)
+            return queue
+
+    def add(self, func, args=(), kw={}, priority=0):
+        """Queue func to be called with args and kw, returning its Job."""
+        job = Job(self, func, args, kw, priority)
+        heapq.heappush(self._heap, (priority, self._order.next(), job))
+        self.depth += 1
+        self._watcher.start()
+        return job
+
+    def _on_cancel(self, job):
+        # The job stays in the heap until it is reached
+        self.depth -= 1
+        self.stats["cancelled"] += 1
+        if not self.depth:
+            del self._heap[:]
+            self._watcher.stop()
+
+    def _on_idle(self):
+        deadline = time.time() + self.budget
+        heap = self._heap
+        while heap:
+            priority, order, job = heapq.heappop(heap)
+            if job.cancelled:
+                continue
+            if job.generator is None:
+                latency = time.time() - job.queued
+                self.stats["total_latency"] += latency
+                self.stats["max_latency"] = max(self.stats["max_latency"],
+                                                latency)
+            self.stats["slices"] += 1
+            try:
+                finished = job._step()
+            except Exception:
+                traceback.print_exc()
+                finished = True
+            if job.cancelled:
+                # Cancelled by its own slice
+                if job.generator is not None:
+                    job.generator.close()
+                continue
+            if finished:
+                job.done = True
+                self.depth -= 1
+                self.stats["done"] += 1
+            else:
+                # Keep its place for the next slice
+                heapq.heappush(heap, (priority, order, job))
+            # At least one slice is run on each iteration
+            if time.time() > deadline:
+                break
+        if not self.depth:
+            del heap[:]
+            self._watcher.stop()
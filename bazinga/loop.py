@@ -1,15 +1,268 @@
-import pyev
+"""Bazinga event loops.
+A loop backend creates watchers calling a function without arguments:
+    * watch_io(fd, callback) when fd is readable, started;
+    * watch_prepare(callback) before the loop waits for events, started;
+    * watch_timer(after, repeat, callback) after a delay, not started;
+    * watch_idle(callback) when there is nothing else to do, not started.
+Watchers have start() and stop() methods, and an active attribute. Timer
+watchers also have set(after, repeat), to be called while stopped, again()
+and remaining(), like pyev timers."""
 
 from base.singleton import Singleton
 from base.object import Object
 
 
-class Loop(Object, pyev.Loop):
-    """An event loop."""
+class Loop(Object):
+    """An event loop, running on libev through pyev."""
+
     def __init__(self):
-        pyev.Loop.__init__(pyev.EVFLAG_NOSIGFD)
+        # Only needed by this backend
+        import pyev
+        self.pyev = pyev
+        self._ev_loop = pyev.Loop(pyev.EVFLAG_NOSIGFD)
+
+    def watch_io(self, fd, callback):
+        watcher = self.pyev.Io(fd, self.pyev.EV_READ, self._ev_loop,
+                               lambda watcher, events: callback())
+        watcher.start()
+        return watcher
+
+    def watch_prepare(self, callback):
+        watcher = self.pyev.Prepare(self._ev_loop,
+                                    lambda watcher, events: callback())
+        watcher.start()
+        return watcher
+
+    def watch_timer(self, after, repeat, callback):
+        return self.pyev.Timer(after, repeat, self._ev_loop,
+                               lambda watcher, events: callback())
+
+    def watch_idle(self, callback):
+        return self.pyev.Idle(self._ev_loop,
+                              lambda watcher, events: callback())
+
+    def run(self):
+        """Run the loop."""
+        self._ev_loop.loop()
+
+    def stop(self):
+        """Stop the loop."""
+        self._ev_loop.unloop()
+
+    # Names of the pyev.Loop methods
+    loop = run
+    unloop = stop
 
 
 class MainLoop(Singleton, Loop):
     """Bazinga main loop."""
     pass
+
+
+class _AsyncioIo(object):
+
+    def __init__(self, loop, fd, callback):
+        self.loop = loop
+        self.fd = fd
+        self.callback = callback
+        self.active = False
+
+    def start(self):
+        if not self.active:
+            self.loop.add_reader(self.fd, self.callback)
+            self.active = True
+
+    def stop(self):
+        if self.active:
+            self.loop.remove_reader(self.fd)
+            self.active = False
+
+
+class _AsyncioTimer(object):
+
+    def __init__(self, loop, after, repeat, callback):
+        self.loop = loop
+        self.after = after
+        self.repeat = repeat
+        self.callback = callback
+        self._handle = None
+        self._deadline = None
+
+    @property
+    def active(self):
+        return self._handle is not None
+
+    def set(self, after, repeat):
+        self.after = after
+        self.repeat = repeat
+
+    def _schedule(self, after):
+        self._deadline = self.loop.time() + after
+        self._handle = self.loop.call_later(after, self._on_timeout)
+
+    def _on_timeout(self):
+        if self.repeat:
+            self._schedule(self.repeat)
+        else:
+            self._handle = None
+        self.callback()
+
+    def start(self):
+        if self._handle is None:
+            self._schedule(self.after)
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def again(self):
+        self.stop()
+        if self.repeat:
+            self._schedule(self.repeat)
+
+    def remaining(self):
+        if self._handle is None:
+            return 0.0
+        return max(0.0, self._deadline - self.loop.time())
+
+
+class _AsyncioIdle(object):
+
+    def __init__(self, loop, selector, callback):
+        self.loop = loop
+        self.selector = selector
+        self.callback = callback
+        self._handle = None
+
+    @property
+    def active(self):
+        return self._handle is not None
+
+    def _on_idle(self):
+        # Being scheduled keeps the selector from waiting, so this runs once
+        # per iteration. Like libev, only call back on iterations without
+        # I/O: events are handled first.
+        self._handle = self.loop.call_soon(self._on_idle)
+        if not self.selector.events:
+            self.callback()
+
+    def start(self):
+        if self._handle is None:
+            self._handle = self.loop.call_soon(self._on_idle)
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+
+class _AsyncioPrepare(object):
+
+    def __init__(self, hooks, callback):
+        self.hooks = hooks
+        self.callback = callback
+        self.active = False
+
+    def start(self):
+        if not self.active:
+            self.hooks.append(self.callback)
+            self.active = True
+
+    def stop(self):
+        if self.active:
+            self.hooks.remove(self.callback)
+            self.active = False
+
+
+class _PrepareSelector(object):
+    """Selector running hooks each time it is about to wait.
+    Its events attribute is the number of events of the last wait."""
+
+    def __init__(self, selector, hooks):
+        self.selector = selector
+        self.hooks = hooks
+        self.events = 0
+
+    def __getattr__(self, name):
+        return getattr(self.selector, name)
+
+    def select(self, timeout=None):
+        for hook in list(self.hooks):
+            hook()
+        ready = self.selector.select(timeout)
+        self.events = len(ready)
+        return ready
+
+
+class AsyncioLoop(Object):
+    """An event loop running on an asyncio loop, or its trollius port.
+    asyncio has no prepare hook, so the loop selector is wrapped to run
+    prepare watchers each time it is about to wait: requests sent by any
+    task are flushed.
+    Without loop, a new selector loop is created: run tasks on it through
+    the loop attribute. To share the loop of an application instead, pass
+    it as loop. It must be a selector loop, like the default loops of
+    asyncio and trollius on Unix: proactor loops have no selector to wrap,
+    and TypeError is raised for them."""
+
+    def __init__(self, loop=None):
+        try:
+            import asyncio
+            import selectors
+        except ImportError:
+            import trollius as asyncio
+            from trollius import selectors
+        self.asyncio = asyncio
+        self._prepare_hooks = []
+        if loop is None:
+            self._selector = _PrepareSelector(selectors.DefaultSelector(),
+                                              self._prepare_hooks)
+            loop = asyncio.SelectorEventLoop(self._selector)
+        else:
+            selector = getattr(loop, "_selector", None)
+            if selector is None:
+                raise TypeError("{0!r} is not a selector loop.".format(loop))
+            self._selector = loop._selector = \
+                    _PrepareSelector(selector, self._prepare_hooks)
+        self.loop = loop
+
+    def watch_io(self, fd, callback):
+        watcher = _AsyncioIo(self.loop, fd, callback)
+        watcher.start()
+        return watcher
+
+    def watch_prepare(self, callback):
+        watcher = _AsyncioPrepare(self._prepare_hooks, callback)
+        watcher.start()
+        return watcher
+
+    def watch_timer(self, after, repeat, callback):
+        return _AsyncioTimer(self.loop, after, repeat, callback)
+
+    def watch_idle(self, callback):
+        return _AsyncioIdle(self.loop, self._selector, callback)
+
+    def wrap_future(self, future):
+        """Return an asyncio future of a bazinga future, so replies can be
+        waited for by coroutines."""
+        wrapped = self.asyncio.Future(loop=self.loop)
+
+        def _resolve(future):
+            if wrapped.cancelled():
+                return
+            if future.exception() is not None:
+                wrapped.set_exception(future.exception())
+            else:
+                wrapped.set_result(future.result())
+
+        future.add_callback(_resolve)
+        return wrapped
+
+    def run(self):
+        """Run the loop."""
+        self.loop.run_forever()
+
+    def stop(self):
+        """Stop the loop."""
+        self.loop.stop()
@@ -6,11 +6,10 @@ class XPixmap(XObject):
     @classmethod
     def create(cls, connection, depth, drawable, width, height):
         xpixmap = super(XPixmap, cls).create(connection)
-        xpixmap.connection.core.CreatePixmapChecked(depth,
-                                                    xpixmap,
-                                                    drawable,
-                                                    width,
-                                                    height).check()
+        xpixmap.connection.void_request("CreatePixmap",
+                                        (depth, xpixmap, drawable,
+                                         width, height),
+                                        xpixmap)
         return xpixmap
 
 
@@ -0,0 +1,60 @@
+"""Bazinga regions."""
+
+
+class Region(object):
+    """A region made of rectangles, stored as (x, y, width, height).
+    Overlapping or touching rectangles are merged into their bounding box,
+    and the whole region becomes its bounding box when it holds more than
+    max_rectangles rectangles."""
+
+    max_rectangles = 16
+
+    def __init__(self, rectangles=()):
+        self.rectangles = []
+        for rectangle in rectangles:
+            self.add(*rectangle)
+
+    def __iter__(self):
+        return iter(self.rectangles)
+
+    def __len__(self):
+        return len(self.rectangles)
+
+    def __repr__(self):
+        return "<{0} {1!r} at 0x{2:x}>".format(self.__class__.__name__,
+                                               self.rectangles, id(self))
+
+    @property
+    def extents(self):
+        """Bounding box of the region, or None if it is empty."""
+        if not self.rectangles:
+            return None
+        x = min([ r[0] for r in self.rectangles ])
+        y = min([ r[1] for r in self.rectangles ])
+        x2 = max([ r[0] + r[2] for r in self.rectangles ])
+        y2 = max([ r[1] + r[3] for r in self.rectangles ])
+        return (x, y, x2 - x, y2 - y)
+
+    def add(self, x, y, width, height):
+        """Add a rectangle to the region."""
+        if width <= 0 or height <= 0:
+            return
+        x2 = x + width
+        y2 = y + height
+        merged = True
+        while merged:
+            merged = False
+            for rectangle in self.rectangles:
+                rx, ry, rwidth, rheight = rectangle
+                if rx <= x2 and x <= rx + rwidth \
+                   and ry <= y2 and y <= ry + rheight:
+                    x = min(x, rx)
+                    y = min(y, ry)
+                    x2 = max(x2, rx + rwidth)
+                    y2 = max(y2, ry + rheight)
+                    self.rectangles.remove(rectangle)
+                    merged = True
+                    break
+        self.rectangles.append((x, y, x2 - x, y2 - y))
+        if len(self.rectangles) > self.max_rectangles:
+            self.rectangles = [ self.extents ]
@@ -53,39 +53,43 @@ class ScreenXinerama(Screen):
     pass
 
 
+def _request_crtc_info(screen):
+    return screen.connection.randr.GetCrtcInfo(screen,
+                                               xcb.xproto.Time.CurrentTime)
+
+
+def _update_crtc_info(screen, reply):
+    Screen.outputs.set_cache(screen,
+                             [ OutputRandr(screen.connection, xid) for xid in
+                               reply.outputs ])
+    Screen.x.set_cache(screen, reply.x)
+    Screen.y.set_cache(screen, reply.y)
+    Screen.width.set_cache(screen, reply.width)
+    Screen.height.set_cache(screen, reply.height)
+
+
 class ScreenRandr(Screen):
     """A screen."""
 
     class x(rocachedproperty):
-        def __get__(self):
-            return self._retrieve_info()
+        __request__ = _request_crtc_info
+        __reply__ = _update_crtc_info
 
     class y(rocachedproperty):
-        def __get__(self):
-            return self._retrieve_info()
+        __request__ = _request_crtc_info
+        __reply__ = _update_crtc_info
 
     class width(rocachedproperty):
-        def __get__(self):
-            return self._retrieve_info()
+        __request__ = _request_crtc_info
+        __reply__ = _update_crtc_info
 
     class height(rocachedproperty):
-        def __get__(self):
-            return self._retrieve_info()
+        __request__ = _request_crtc_info
+        __reply__ = _update_crtc_info
 
     class outputs(rocachedproperty):
-        def __get__(self):
-            return self._retrieve_info()
-
-    def _retrieve_info(self):
-        reply = self.connection.randr.GetCrtcInfo(self,
-                                                  xcb.xproto.Time.CurrentTime).reply()
-        Screen.outputs.set_cache(self,
-                                 [ OutputRandr(self.connection, xid) for xid in
-                                   reply.outputs ])
-        Screen.x.set_cache(self, reply.x)
-        Screen.y.set_cache(self, reply.y)
-        Screen.width.set_cache(self, reply.width)
-        Screen.height.set_cache(self, reply.height)
+        __request__ = _request_crtc_info
+        __reply__ = _update_crtc_info
 
 
 class Output(Object):
@@ -96,20 +100,32 @@ class Output(Object):
         pass
 
 
+def _request_output_info(output):
+    return output.connection.randr.GetOutputInfo(output,
+                                                 xcb.xproto.Time.CurrentTime)
+
+
+def _update_output_info(output, info):
+    from x import byte_list_to_str
+    OutputRandr.name.set_cache(output, byte_list_to_str(info.name))
+    OutputRandr.width_mm.set_cache(output, info.mm_width)
+    OutputRandr.height_mm.set_cache(output, info.mm_height)
+
+
 class OutputRandr(Output, int):
     """A screen output."""
 
     class name(rocachedproperty):
-        def __get__(self):
-            return self._retrieve_info()
+        __request__ = _request_output_info
+        __reply__ = _update_output_info
 
     class width_mm(rocachedproperty):
-        def __get__(self):
-            return self._retrieve_info()
+        __request__ = _request_output_info
+        __reply__ = _update_output_info
 
     class height_mm(rocachedproperty):
-        def __get__(self):
-            return self._retrieve_info()
+        __request__ = _request_output_info
+        __reply__ = _update_output_info
 
     def __new__(cls, connection, xid):
         return super(OutputRandr, cls).__new__(cls, xid)
@@ -117,14 +133,6 @@ class OutputRandr(Output, int):
     def __init__(self, connection, xid):
         self.connection = connection
 
-    def _retrieve_info(self):
-        info = self.connection.randr.GetOutputInfo(self,
-                                                   xcb.xproto.Time.CurrentTime).reply()
-        from x import byte_list_to_str
-        OutputRandr.name.set_cache(self, byte_list_to_str(info.name))
-        OutputRandr.width_mm.set_cache(self, info.mm_width)
-        OutputRandr.height_mm.set_cache(self, info.mm_height)
-
     def __repr__(self):
         return "<{0} {1} at 0x{2:x}>".format(self.__class__.__name__,
                                              int(self), id(self))
@@ -1,27 +1,182 @@
-import pyev
 import base.signal as signal
 from base.object import Object
 from loop import MainLoop
 
+import collections
+import heapq
+import math
+import time
 
-class Timer(Object, pyev.Timer):
+
+class TimerWheel(object):
+    """Timers sharing a single loop timer.
+    Time is cut in slots of slack seconds, and a timer fires at the end of
+    the slot holding its deadline: timers of the same slot fire together,
+    at most slack seconds late. Slots are only stored while they hold
+    timers, with their numbers in a heap, so adding or removing a timer
+    does not depend on the number of timers."""
+
+    def __init__(self, loop, slack):
+        self.loop = loop
+        self.slack = slack
+        # Slot number -> timers, in insertion order
+        self._slots = {}
+        # Numbers of the slots in _slots
+        self._heap = []
+        # Slot the loop timer is set for
+        self._armed = None
+        self._watcher = loop.watch_timer(0, 0, self._on_timeout)
+        # Number of times the loop timer fired
+        self.wakeups = 0
+
+    @classmethod
+    def get(cls, loop, slack):
+        """Return the wheel of loop for slack."""
+        try:
+            wheels = loop._timer_wheels
+        except AttributeError:
+            wheels = loop._timer_wheels = {}
+        wheel = wheels.get(slack)
+        if wheel is None:
+            wheel = wheels[slack] = cls(loop, slack)
+        return wheel
+
+    def _arm(self, slot):
+        self._watcher.stop()
+        self._watcher.set(max(0, slot * self.slack - time.time()), 0)
+        self._watcher.start()
+        self._armed = slot
+
+    def add(self, timer, deadline):
+        """Schedule timer at deadline, returning its slot."""
+        slot = int(math.ceil(deadline / self.slack))
+        timers = self._slots.get(slot)
+        if timers is None:
+            timers = self._slots[slot] = collections.OrderedDict()
+            heapq.heappush(self._heap, slot)
+            if self._armed is None or slot < self._armed:
+                self._arm(slot)
+        timers[timer] = None
+        return slot
+
+    def remove(self, timer, slot):
+        """Unschedule timer from slot."""
+        timers = self._slots.get(slot)
+        if timers is not None:
+            # The slot is dropped when it is reached
+            timers.pop(timer, None)
+
+    def _on_timeout(self):
+        self.wakeups += 1
+        self._armed = None
+        now = time.time()
+        heap = self._heap
+        while heap and heap[0] * self.slack <= now:
+            # Timers stopped by the ones firing before them are removed
+            # from this very dictionary, and do not fire.
+            timers = self._slots[heap[0]]
+            while timers:
+                timer, none = timers.popitem(last=False)
+                timer._on_wheel_timeout(now)
+            del self._slots[heapq.heappop(heap)]
+        # Skip slots emptied by remove()
+        while heap and not self._slots[heap[0]]:
+            del self._slots[heapq.heappop(heap)]
+        if heap:
+            self._arm(heap[0])
+
+
+class Timer(Object):
     class Timeout(signal.Signal):
         """Timeout signal.  This is send by the timeout object."""
         pass
 
     """Timer object.
-    This object sends a Timeout signal every time you configure it for."""
+    This object sends a Timeout signal every time you configure it for.
+    With slack, it may fire up to slack seconds late, sharing a TimerWheel
+    with the other timers of the loop with the same slack."""
 
-    def __init__(self, after, repeat, loop=None):
+    def __init__(self, after, repeat, loop=None, slack=0):
         """Initialize a timeout object."""
         if loop is None:
             loop = MainLoop()
-        super(Timer, self).__init__(after, repeat, loop, Timer._on_timeout)
+        self.loop = loop
+        self.after = after
+        self.repeat = repeat
+        if slack:
+            self._wheel = TimerWheel.get(loop, slack)
+            self._slot = None
+        else:
+            self._wheel = None
+            self._watcher = loop.watch_timer(after, repeat, self._on_timeout)
+
+    def _on_timeout(self):
+        self.emit_signal(signal=Timer.Timeout)
+
+    def _on_wheel_timeout(self, now):
+        if self.repeat:
+            # Bypass Object.__setattr__, nobody cares about notify here
+            object.__setattr__(self, "_slot",
+                               self._wheel.add(self, now + self.repeat))
+        else:
+            object.__setattr__(self, "_slot", None)
+        self._on_timeout()
+
+    @property
+    def active(self):
+        if self._wheel:
+            return self._slot is not None
+        return self._watcher.active
+
+    def start(self):
+        """Start the timer."""
+        if self._wheel:
+            if self._slot is None:
+                object.__setattr__(self, "_slot",
+                                   self._wheel.add(self, time.time() + self.after))
+        else:
+            self._watcher.start()
+
+    def stop(self):
+        """Stop the timer."""
+        if self._wheel:
+            if self._slot is not None:
+                self._wheel.remove(self, self._slot)
+                object.__setattr__(self, "_slot", None)
+        else:
+            self._watcher.stop()
+
+    def set(self, after, repeat):
+        """Configure the timer. It must be stopped."""
+        self.after = after
+        self.repeat = repeat
+        if not self._wheel:
+            self._watcher.set(after, repeat)
+
+    def again(self):
+        """Restart the timer to fire after repeat seconds, or stop it if it
+        does not repeat."""
+        if self._wheel:
+            self.stop()
+            if self.repeat:
+                object.__setattr__(self, "_slot",
+                                   self._wheel.add(self, time.time() + self.repeat))
+        else:
+            self._watcher.again()
 
+    def remaining(self):
+        """Return the number of seconds before the timer fires."""
+        if self._wheel:
+            if self._slot is None:
+                return 0.0
+            return max(0.0, self._slot * self._wheel.slack - time.time())
+        return self._watcher.remaining()
 
-    @staticmethod
-    def _on_timeout(watcher, event):
-        watcher.emit_signal(signal=Timer.Timeout)
+    def reschedule(self, after):
+        """Restart the timer to fire after seconds."""
+        self.stop()
+        self.set(after, self.repeat)
+        self.start()
 
     def on_timeout(self, func):
         """Connect a function to the timer timeout."""
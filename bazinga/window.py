@@ -1,23 +1,134 @@
 """Bazinga window objects."""
 
 import base
-from base.property import cachedproperty, rocachedproperty
+import base.signal as signal
+from base.property import CachedProperty, cachedproperty, rocachedproperty, prefetch
 from base.object import Notify
-from x import XObject, byte_list_to_uint32, byte_list_to_str
+from x import Connection, XObject, byte_list_to_uint32
 from atom import Atom
 from color import Color
 from cursor import Cursor
+from region import Region
 import event
 
 import xcb.xproto
 from PIL import Image
+import collections
+import itertools
 import struct
+import sys
 import weakref
 
 class BadWindow(base.Exception):
     pass
 
 
+# Icon pixels are CARDINAL 0xAARRGGBB values, in client byte order
+if sys.byteorder == "little":
+    _icon_raw_mode = "BGRA"
+else:
+    _icon_raw_mode = "ARGB"
+
+
+def _encode_icon(image):
+    """Return _NET_WM_ICON data of an image: width, height and pixels.
+    Icon pixels are not premultiplied."""
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    red, green, blue, alpha = image.split()
+    if sys.byteorder == "little":
+        bands = (blue, green, red, alpha)
+    else:
+        bands = (alpha, red, green, blue)
+    return struct.pack("II", image.size[0], image.size[1]) \
+            + Image.merge("RGBA", bands).tostring()
+
+
+def _decode_icon(buf, offset, width, height):
+    """Return the icon of width x height pixels at offset in buf."""
+    return Image.frombuffer("RGBA", (width, height),
+                            buffer(buf, offset, width * height * 4),
+                            "raw", _icon_raw_mode, 0, 1)
+
+
+# Maximum length read from _NET_WM_ICON, in 32 bits units
+_icon_max_length = 0x3fffffff
+
+# Scaled icons returned by Window.icon_for(), least recently used first
+_icon_cache = collections.OrderedDict()
+_icon_cache_size = 512
+
+
+class Icons(object):
+    """Icons stored in a _NET_WM_ICON property reply.
+    Sizes are indexed in sizes as (width, height, offset), and icons are
+    only decoded when asked for. Each instance gets a different serial."""
+
+    _serials = itertools.count()
+
+    def __init__(self, prop):
+        # Keep the reply value alive, we use its buffer
+        self.value = prop.value
+        self.buf = prop.value.buf()
+        self.serial = next(self._serials)
+        self.sizes = []
+        offset = 0
+        while offset + 8 <= len(self.buf):
+            width, height = struct.unpack_from("II", self.buf, offset)
+            end = offset + 8 + width * height * 4
+            if not width or not height or end > len(self.buf):
+                break
+            self.sizes.append((width, height, offset + 8))
+            offset = end
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def image(self, index):
+        """Decode an icon."""
+        width, height, offset = self.sizes[index]
+        return _decode_icon(self.buf, offset, width, height)
+
+    def nearest(self, size):
+        """Return the index of the smallest icon at least size pixels large,
+        or of the largest icon if there is none."""
+        larger = [ (max(width, height), index)
+                   for index, (width, height, offset) in enumerate(self.sizes)
+                   if max(width, height) >= size ]
+        if larger:
+            return min(larger)[1]
+        return max([ (max(width, height), index)
+                     for index, (width, height, offset) in enumerate(self.sizes) ])[1]
+
+
+def _request_geometry(window):
+    return window.connection.core.GetGeometry(window)
+
+
+def _update_geometry(window, wg):
+    """Update window geometry from a GetGeometry reply."""
+    with window.freeze_notify():
+        Window.x.set_cache(window, wg.x)
+        Window.y.set_cache(window, wg.y)
+        Window.width.set_cache(window, wg.width)
+        Window.height.set_cache(window, wg.height)
+        Window.border_width.set_cache(window, wg.border_width)
+        Window.depth.set_cache(window, wg.depth)
+        Window.root.set_cache(window, Window(window.connection, wg.root))
+
+
+def _request_window_attributes(window):
+    return window.connection.core.GetWindowAttributes(window)
+
+
+def _update_window_attributes(window, wa):
+    """Update window attributes from a GetWindowAttributes reply."""
+    with window.freeze_notify():
+        Window.colormap.set_cache(window, wa.colormap)
+        Window.visual.set_cache(window, wa.visual)
+        Window.override_redirect.set_cache(window, wa.override_redirect)
+
+
 class Window(XObject):
     """A basic X window."""
 
@@ -53,6 +164,14 @@ class Window(XObject):
 
     __events = xcb.xproto.EventMask.NoEvent
 
+    # Region exposed by the Expose events received so far
+    _damage = None
+
+    class Damage(signal.Signal):
+        """Damage signal.
+        This is sent with the region exposed by a series of Expose events."""
+        pass
+
     Visibility = xcb.xproto.Visibility
     Visibility.Unknown = -1
 
@@ -63,8 +182,8 @@ class Window(XObject):
 
     class x(cachedproperty):
         """X coordinate."""
-        def __get__(self):
-            self._retrieve_geometry()
+        __request__ = _request_geometry
+        __reply__ = _update_geometry
 
         def __set__(self, value):
             self.connection.core.ConfigureWindow(self,
@@ -76,8 +195,8 @@ class Window(XObject):
 
     class y(cachedproperty):
         """Y coordinate."""
-        def __get__(self):
-            self._retrieve_geometry()
+        __request__ = _request_geometry
+        __reply__ = _update_geometry
 
         def __set__(self, value):
             self.connection.core.ConfigureWindow(self,
@@ -89,8 +208,8 @@ class Window(XObject):
 
     class width(cachedproperty):
         """Width."""
-        def __get__(self):
-            self._retrieve_geometry()
+        __request__ = _request_geometry
+        __reply__ = _update_geometry
 
         def __set__(self, value):
             self.connection.core.ConfigureWindow(self,
@@ -102,21 +221,21 @@ class Window(XObject):
 
     class height(cachedproperty):
         """Height."""
-        def __get__(self):
-            self._retrieve_geometry()
+        __request__ = _request_geometry
+        __reply__ = _update_geometry
 
         def __set__(self, value):
             self.connection.core.ConfigureWindow(self,
                                                  xcb.xproto.ConfigWindow.Height,
-                                                 [ self.height ])
+                                                 [ value ])
 
         def __delete__(self):
             raise AttributeError
 
     class border_width(cachedproperty):
         """Border width."""
-        def __get__(self):
-            self._retrieve_geometry()
+        __request__ = _request_geometry
+        __reply__ = _update_geometry
 
         def __set__(self, value):
             self.connection.core.ConfigureWindow(self,
@@ -128,20 +247,22 @@ class Window(XObject):
 
     class depth(rocachedproperty):
         """Window color depth."""
-        def __get__(self):
-            self._retrieve_geometry()
+        __request__ = _request_geometry
+        __reply__ = _update_geometry
 
     class root(rocachedproperty):
         """Root window this window is attached on."""
-        def __get__(self):
-            self._retrieve_geometry()
+        __request__ = _request_geometry
+        __reply__ = _update_geometry
 
     class parent(cachedproperty):
         """Parent window."""
-        def __get__(self):
-            parent = self.connection.core.QueryTree(self).reply().parent
-            if parent > 0:
-                return Window(parent)
+        def __request__(self):
+            return self.connection.core.QueryTree(self)
+
+        def __reply__(self, reply):
+            if reply.parent > 0:
+                return Window(self.connection, reply.parent)
 
         def __set__(self, value):
             self.connection.core.ReparentWindow(self, value, self.x, self.y)
@@ -207,17 +328,18 @@ class Window(XObject):
 
     class colormap(rocachedproperty):
         """Colormap of the window."""
-        def __get__(self):
-            self._retrieve_window_attributes()
+        __request__ = _request_window_attributes
+        __reply__ = _update_window_attributes
 
     class visual(rocachedproperty):
         """Visual of the window."""
-        def __get__(self):
-            self._retrieve_window_attributes()
+        __request__ = _request_window_attributes
+        __reply__ = _update_window_attributes
 
     class override_redirect(cachedproperty):
-        def __get__(self):
-            self._retrieve_window_attributes()
+        """Override redirect flag of the window."""
+        __request__ = _request_window_attributes
+        __reply__ = _update_window_attributes
 
         def __set__(self, value):
             self.connection.core.ChangeWindowAttributes(self,
@@ -228,11 +350,16 @@ class Window(XObject):
             raise AttributeError
 
     class protocols(cachedproperty):
-        def __get__(self):
-            prop = self.connection.core.GetProperty(False, self,
+        """Protocols supported by the window."""
+        atom = "WM_PROTOCOLS"
+
+        def __request__(self):
+            return self.connection.core.GetProperty(False, self,
                                                     Atom(self.connection, "WM_PROTOCOLS"),
                                                     Atom(self.connection, "ATOM"),
-                                                    0, 1024).reply()
+                                                    0, 1024)
+
+        def __reply__(self, prop):
             atoms = byte_list_to_uint32(prop.value)
             if atoms:
                 protos = set()
@@ -240,49 +367,71 @@ class Window(XObject):
                     protos.add(Atom(self.connection, a))
                 return protos
 
-    class icon(cachedproperty):
-        """Window icon."""
-        def __get__(self):
-            prop = self.connection.core.GetProperty(False, self,
+    class icons(rocachedproperty):
+        """Icons of the window, indexed by size but not decoded."""
+        atom = "_NET_WM_ICON"
+
+        def __request__(self):
+            return self.connection.core.GetProperty(False, self,
                                                     Atom(self.connection, "_NET_WM_ICON"),
                                                     Atom(self.connection, "CARDINAL"),
-                                                    # Max icon size is:
-                                                    #  w  *  h  * (rgba)
-                                                    0, 256*256*4).reply()
-            if len(prop.value) % 4 == 0:
-                width, height = byte_list_to_uint32(prop.value[:8])
-                return Image.frombuffer("RGBA",
-                                        (width, height),
-                                        byte_list_to_str(prop.value[8:]),
-                                        "raw", "ARGB", 0, 1)
+                                                    0, _icon_max_length)
+
+        def __reply__(self, prop):
+            return Icons(prop)
+
+    class icon(cachedproperty):
+        """Window icon. This is the first icon of the window."""
+        atom = "_NET_WM_ICON"
+
+        def __get__(self):
+            if self.icons:
+                return self.icons.image(0)
 
         def __set__(self, image):
-            _imagedata = image.tostring("raw", "RGBA", 0, 1)
-            # Convert to ARGB
-            imagedata = ""
-            for i in range(0, len(_imagedata), 4):
-                imagedata += _imagedata[i + 3] # A
-                imagedata += _imagedata[i]     # R
-                imagedata += _imagedata[i + 1] # G
-                imagedata += _imagedata[i + 2] # B
-
-            data = struct.pack("II{0}s".format(len(imagedata)),
-                               image.size[0], image.size[1], imagedata)
+            data = _encode_icon(image)
+            Window.icons.del_cache(self)
             self.connection.core.ChangeProperty(xcb.xproto.Property.NewValue,
                                                 self,
                                                 Atom(self.connection, "_NET_WM_ICON"),
                                                 Atom(self.connection, "CARDINAL"),
                                                 32, len(data) / 4, data)
 
+    def icon_for(self, size):
+        """Return the window icon scaled to fit in size x size pixels.
+        The icon nearest that size is decoded and scaled when needed, and
+        the result is kept in a cache shared by all windows."""
+        icons = self.icons
+        if not icons:
+            return None
+        key = (int(self), size, icons.serial)
+        try:
+            image = _icon_cache.pop(key)
+        except KeyError:
+            image = icons.image(icons.nearest(size))
+            if max(image.size) != size:
+                ratio = float(size) / max(image.size)
+                image = image.resize((max(1, int(image.size[0] * ratio)),
+                                      max(1, int(image.size[1] * ratio))),
+                                     Image.ANTIALIAS)
+        _icon_cache[key] = image
+        while len(_icon_cache) > _icon_cache_size:
+            _icon_cache.popitem(last=False)
+        return image
+
     class transient_for(rocachedproperty):
         """Window this window is transient for."""
-        def __get__(self):
-            prop = self.connection.core.GetProperty(False, self,
+        atom = "WM_TRANSIENT_FOR"
+
+        def __request__(self):
+            return self.connection.core.GetProperty(False, self,
                                                     Atom(self.connection, "WM_TRANSIENT_FOR"),
                                                     Atom(self.connection, "WINDOW"),
-                                                    0, 1).reply()
+                                                    0, 1)
+
+        def __reply__(self, prop):
             if prop.value:
-                return Window(byte_list_to_uint32(prop.value)[0])
+                return Window(self.connection, byte_list_to_uint32(prop.value)[0])
 
         def __set__(self, value):
             self.connection.core.ChangeProperty(xcb.xproto.Property.NewValue,
@@ -293,24 +442,39 @@ class Window(XObject):
 
     class machine(rocachedproperty):
         """Machine this window is running on."""
-        def __get__(self):
-            return self.connection.get_text_property(self, "WM_CLIENT_MACHINE")
+        atom = "WM_CLIENT_MACHINE"
+
+        def __request__(self):
+            return self.connection.request_text_property(self, "WM_CLIENT_MACHINE")
+
+        def __reply__(self, prop):
+            return self.connection.text_property_value(prop)
 
         def __set__(self, value):
             self.connection.set_text_property(self, "WM_CLIENT_MACHINE", value)
 
     class _icccm_name(cachedproperty):
         """ICCCM window name."""
-        def __get__(self):
-            return self.connection.get_text_property(self, "WM_NAME")
+        atom = "WM_NAME"
+
+        def __request__(self):
+            return self.connection.request_text_property(self, "WM_NAME")
+
+        def __reply__(self, prop):
+            return self.connection.text_property_value(prop)
 
         def __set__(self, value):
             self.connection.set_text_property(self, "WM_NAME", value)
 
     class _netwm_name(cachedproperty):
         """EWMH window name."""
-        def __get__(self):
-            return self.connection.get_text_property(self, "_NET_WM_NAME")
+        atom = "_NET_WM_NAME"
+
+        def __request__(self):
+            return self.connection.request_text_property(self, "_NET_WM_NAME")
+
+        def __reply__(self, prop):
+            return self.connection.text_property_value(prop)
 
         def __set__(self, value):
             self.connection.set_text_property(self, "_NET_WM_NAME", value)
@@ -326,16 +490,26 @@ class Window(XObject):
 
     class _icccm_icon_name(cachedproperty):
         """ICCCM window name."""
-        def __get__(self):
-            return self.connection.get_text_property(self, "WM_ICON_NAME")
+        atom = "WM_ICON_NAME"
+
+        def __request__(self):
+            return self.connection.request_text_property(self, "WM_ICON_NAME")
+
+        def __reply__(self, prop):
+            return self.connection.text_property_value(prop)
 
         def __set__(self, value):
             self.connection.set_text_property(self, "WM_ICON_NAME", value)
 
     class _netwm_icon_name(cachedproperty):
         """EWMH window icon name."""
-        def __get__(self):
-            return self.connection.get_text_property(self, "_NET_WM_ICON_NAME")
+        atom = "_NET_WM_ICON_NAME"
+
+        def __request__(self):
+            return self.connection.request_text_property(self, "_NET_WM_ICON_NAME")
+
+        def __reply__(self, prop):
+            return self.connection.text_property_value(prop)
 
         def __set__(self, value):
             self.connection.set_text_property(self, "_NET_WM_ICON_NAME", value)
@@ -354,65 +528,122 @@ class Window(XObject):
         # Mandatory, we want this.
         # XXX this is bad. When doing create(), we call this before CreateWindow
         self._set_events(Window._events_to_always_listen)
-        # Receive events and errors from the X connection
-        self.connection.connect_signal(self._dispatch_events,
-                                       signal=xcb.Event)
-        self.connection.connect_signal(self._dispatch_errors,
-                                       signal=xcb.Error)
 
     def __getattr__(self, value):
         if value != Window._valid.key and not self._valid:
             raise BadWindow("This window has been destroyed.")
         return super(Window, self).__getattr__(value)
 
-    def _is_event_for_me(self, event):
-        """Guess if an X even is for us or not."""
-
-        if event.__class__ in Window.events_window_attribute.keys():
-            return getattr(event, Window.events_window_attribute[event.__class__][1]) == self
-        return False
-
-    def _dispatch_events(self, signal):
-        """Dipatch signals that belongs to us."""
-        if self._is_event_for_me(signal):
-            self.emit_signal(signal)
-
-    def _dispatch_errors(self, signal):
-        """Dispatch errors that belongs to us."""
-        if signal.bad_value == self:
-            self.emit_signal(signal)
-
     def _set_events(self, events):
         """Set events that shall be received by the window."""
         if events != self.__events:
-            self.connection.core.ChangeWindowAttributesChecked(self,
-                                                               xcb.xproto.CW.EventMask,
-                                                               [ events ]).check()
             self.__events = events
+            if self.connection._deferred_checks is None:
+                self.connection.void_request("ChangeWindowAttributes",
+                                             (self,
+                                              xcb.xproto.CW.EventMask,
+                                              [ events ]),
+                                             self)
+            else:
+                cookie = self.connection.core.ChangeWindowAttributesChecked(self,
+                                                                            xcb.xproto.CW.EventMask,
+                                                                            [ events ])
+                self.connection._deferred_checks.append((self, cookie))
+
+    # configure() arguments with their ConfigureWindow flag, in protocol order
+    _configure_fields = (("x", xcb.xproto.ConfigWindow.X),
+                         ("y", xcb.xproto.ConfigWindow.Y),
+                         ("width", xcb.xproto.ConfigWindow.Width),
+                         ("height", xcb.xproto.ConfigWindow.Height),
+                         ("border_width", xcb.xproto.ConfigWindow.BorderWidth),
+                         ("sibling", xcb.xproto.ConfigWindow.Sibling),
+                         ("stack_mode", xcb.xproto.ConfigWindow.StackMode))
+
+    def configure(self, x=None, y=None, width=None, height=None,
+                  border_width=None, sibling=None, stack_mode=None):
+        """Configure the window with a single request.
+        Arguments left to None are not changed. The geometry cache is
+        updated right away, and reconciled by the ConfigureNotify event."""
+        mask = 0
+        values = []
+        for (name, flag), value in zip(self._configure_fields,
+                                       (x, y, width, height, border_width,
+                                        sibling, stack_mode)):
+            if value is not None:
+                mask |= flag
+                values.append(value)
+        if not mask:
+            return
+        self.connection.void_request("ConfigureWindow",
+                                     (self, mask, values),
+                                     self)
+        with self.freeze_notify():
+            for prop, value in ((Window.x, x),
+                                (Window.y, y),
+                                (Window.width, width),
+                                (Window.height, height),
+                                (Window.border_width, border_width)):
+                if value is not None:
+                    prop.set_cache(self, value)
+            if sibling is not None and stack_mode == xcb.xproto.StackMode.Above:
+                Window.above_sibling.set_cache(self, sibling)
 
     def _add_event(self, event):
         """Add an event that shall be received by the window."""
         self._set_events(self.__events | event)
 
-    def _retrieve_geometry(self):
-        """Update window geometry."""
-        wg = self.connection.core.GetGeometry(self).reply()
-        Window.x.set_cache(self, wg.x)
-        Window.y.set_cache(self, wg.y)
-        Window.width.set_cache(self, wg.width)
-        Window.height.set_cache(self, wg.height)
-        Window.border_width.set_cache(self, wg.border_width)
-        Window.depth.set_cache(self, wg.depth)
-        Window.root.set_cache(self, Window(wg.root))
-
     def _retrieve_window_attributes(self):
         """Update windows attributes."""
-        wa = self.connection.core.GetWindowAttributes(self).reply()
-        Window.colormap.set_cache(self, wa.colormap)
-        Window.visual.set_cache(self, wa.visual)
-        Window.override_redirect.set_cache(self, wa.override_redirect)
+        wa = _request_window_attributes(self).reply()
+        _update_window_attributes(self, wa)
         return wa
 
+    def _get_atom_properties(self):
+        """Return cached properties of this window class storing an X
+        property, indexed by the atom of that property."""
+        cls = self.__class__
+        try:
+            return self.connection._atom_properties[cls]
+        except KeyError:
+            pass
+        properties = {}
+        for klass in reversed(cls.__mro__):
+            for prop in vars(klass).itervalues():
+                if isinstance(prop, CachedProperty):
+                    properties[prop.name] = prop
+        properties = [ prop for prop in properties.itervalues() if prop.atom ]
+        atoms = Atom.intern_many(self.connection,
+                                 [ prop.atom for prop in properties ])
+        atom_properties = {}
+        for atom, prop in zip(atoms, properties):
+            atom_properties.setdefault(atom, []).append(prop)
+        self.connection._atom_properties[cls] = atom_properties
+        return atom_properties
+
+    _fetch_aliases = {
+        "name": ("_netwm_name", "_icccm_name"),
+        "icon_name": ("_netwm_icon_name", "_icccm_icon_name"),
+    }
+
+    # Properties made of several cached properties
+    _prefetch_aliases = dict(_fetch_aliases, icon=("icons",))
+
+    # Properties fetched by Connection.scan_tree()
+    _scan_properties = ("x", "y", "width", "height", "border_width", "depth",
+                        "root", "colormap", "visual", "override_redirect")
+
+    @classmethod
+    def prefetch(cls, windows, names):
+        """Fetch properties of many windows at once.
+        All requests are sent before waiting for any reply, so this costs
+        about one round trip whatever the number of windows:
+            Window.prefetch(windows, ("name", "icon", "protocols"))"""
+        properties = []
+        for name in names:
+            for prop_name in cls._prefetch_aliases.get(name, (name,)):
+                properties.append(getattr(cls, prop_name))
+        prefetch(windows, properties, xcb.ProtocolException)
+
     # Methods
     def destroy(self):
         self.connection.core.DestroyWindow(self)
@@ -475,17 +706,23 @@ class Window(XObject):
     def ungrab_pointer():
         return self.connection.ungrab_pointer()
 
-    def get_children(self):
-        qt = self.connection.core.QueryTree(self)
+    def _update_children(self, reply):
         children = set()
-        reply = qt.reply()
         # Update parent and root, it's free!
-        Window.parent.set_cache(self, Window(reply.parent))
-        Window.root.set_cache(self, Window(reply.root))
+        Window.parent.set_cache(self, Window(self.connection, reply.parent))
+        Window.root.set_cache(self, Window(self.connection, reply.root))
         for w in reply.children:
-            children.add(Window(w))
+            children.add(Window(self.connection, w))
         return children
 
+    def get_children(self):
+        return self._update_children(self.connection.core.QueryTree(self).reply())
+
+    def fetch_children(self):
+        """Return a Future of the children of this window."""
+        cookie = self.connection.core.QueryTree(self)
+        return self.connection.wait_for_reply(cookie).then(self._update_children)
+
     def takefocus(self):
         """Send a take focus request to a window."""
         # XXX Seriously, we need to do some stuff for xpyb about this.
@@ -515,16 +752,18 @@ class Window(XObject):
         """Create a subwindow for this window."""
         # Always listen to this events at creation.
         # Otherwise our cache might not be up to date.
-        create_window = \
-        connection.core.CreateWindowChecked(xcb.xproto.WindowClass.CopyFromParent,
-                                            xid,
-                                            parent,
-                                            x, y, width, height,
-                                            border_width,
-                                            xcb.xproto.WindowClass.CopyFromParent,
-                                            xcb.xproto.WindowClass.CopyFromParent,
-                                            xcb.xproto.CW.EventMask,
-                                            [ Window._events_to_always_listen ])
+        # Errors are sent as Connection.RequestError on the window.
+        connection.void_request("CreateWindow",
+                                (xcb.xproto.WindowClass.CopyFromParent,
+                                 xid,
+                                 parent,
+                                 x, y, width, height,
+                                 border_width,
+                                 xcb.xproto.WindowClass.CopyFromParent,
+                                 xcb.xproto.WindowClass.CopyFromParent,
+                                 xcb.xproto.CW.EventMask,
+                                 [ Window._events_to_always_listen ]),
+                                xid)
 
         window = cls(connection, xid)
         window.__events = Window._events_to_always_listen
@@ -535,8 +774,6 @@ class Window(XObject):
         cls.width.set_cache(window, width)
         cls.height.set_cache(window, height)
 
-        create_window.check()
-
         return window
 
     # Helpers
@@ -552,6 +789,13 @@ class Window(XObject):
         return self.__class__.create(self.connection, self,
                                      x, y, width, height, border_width)
 
+    def on_damage(self, func):
+        """Connect a function to the window damage.
+        The function receives the exposed area as region argument."""
+        self._add_event(xcb.xproto.EventMask.Exposure)
+        self.connect_signal(func, self.Damage)
+        return func
+
     def on_key_press(self, state, detail):
         self.grab_key(state, detail)
         def _on_key_press(func):
@@ -569,41 +813,47 @@ _property_renotify_map = {
     Notify("_netwm_icon_name"): Notify("icon_name"),
 }
 
-@Window.on_class_signal(Notify)
 def _property_renotify(sender, signal):
     """Reemit some notify events differently."""
-    if _property_renotify_map.has_key(signal):
-        sender.emit_signal(_property_renotify_map[signal])
+    sender.emit_signal(_property_renotify_map[signal])
+
+# Only connect on these keys: a receiver on the Notify class would be found
+# for every attribute write of every window.
+for _notify in _property_renotify_map:
+    Window.connect_class_signal(_property_renotify, _notify)
 
 
 # Handle ConfigureNotify to update cached attributes
 @Window.on_class_signal(xcb.xproto.ConfigureNotifyEvent)
 def _on_configure_update_geometry(sender, signal):
     """Update window geometry from an event."""
-    Window.x.set_cache(sender, signal.x)
-    Window.y.set_cache(sender, signal.y)
-    Window.width.set_cache(sender, signal.width)
-    Window.height.set_cache(sender, signal.height)
-    Window.border_width.set_cache(sender, signal.border_width)
-    Window.above_sibling.set_cache(sender, signal.above_sibling)
-    Window.override_redirect.set_cache(sender, signal.override_redirect)
+    with sender.freeze_notify():
+        Window.x.set_cache(sender, signal.x)
+        Window.y.set_cache(sender, signal.y)
+        Window.width.set_cache(sender, signal.width)
+        Window.height.set_cache(sender, signal.height)
+        Window.border_width.set_cache(sender, signal.border_width)
+        Window.above_sibling.set_cache(sender, signal.above_sibling)
+        Window.override_redirect.set_cache(sender, signal.override_redirect)
 
 
 @Window.on_class_signal(xcb.xproto.PropertyNotifyEvent)
 def _on_property_change_del_cache(sender, signal):
-    _atom_to_property = {
-        Atom(sender.connection, "WM_NAME"): "_icccm_name",
-        Atom(sender.connection, "_NET_WM_NAME"): "_netwm_name",
-        Atom(sender.connection, "WM_ICON_NAME"): "_icccm_icon_name",
-        Atom(sender.connection, "_NET_WM_ICON_NAME"): "_netwm_icon_name",
-        Atom(sender.connection, "WM_TRANSIENT_FOR"): "transient_for",
-        Atom(sender.connection, "WM_CLIENT_MACHINE"): "machine",
-        Atom(sender.connection, "_NET_WM_ICON"): "icon",
-        Atom(sender.connection, "WM_PROTOCOLS"): "protocols",
-    }
-    if _atom_to_property.has_key(signal.atom):
-        # Erase cache
-        getattr(Window, _atom_to_property[signal.atom]).del_cache(sender)
+    """Erase cache of properties storing the changed X property."""
+    for prop in sender._get_atom_properties().get(signal.atom, ()):
+        prop.del_cache(sender)
+
+
+@Window.on_class_signal(xcb.xproto.ExposeEvent)
+def _on_expose_accumulate_damage(sender, signal):
+    """Accumulate exposed areas until the last Expose of a series."""
+    if sender._damage is None:
+        sender._damage = Region()
+    sender._damage.add(signal.x, signal.y, signal.width, signal.height)
+    if signal.count == 0:
+        region = sender._damage
+        sender._damage = None
+        sender.emit_signal(Window.Damage, region=region)
 
 
 @Window.on_class_signal(xcb.xproto.VisibilityNotifyEvent)
@@ -633,3 +883,8 @@ def _build_key_button_event(xevent, cls):
     return event
 
 Window.on_class_signal(xcb.Event)(event.Event.convert_and_reemit)
+
+# Let the connection route window events directly to their window
+Connection.events_xid_attribute.update(
+    (event_class, attribute) for event_class, (mask, attribute)
+    in Window.events_window_attribute.iteritems())
@@ -1,17 +1,115 @@
-import pyev
 import xcb.xproto
 import traceback
+import collections
+import functools
+import os
 import struct
+import sys
+import time
 import weakref
 
 from screen import Screen, ScreenXinerama, ScreenRandr, Output, OutputRandr
 from base.singleton import Singleton, SingletonPool
 from base.property import rocachedproperty
-from base.object import Object
+import base
+from base.object import Object, flush_notify
+from base.future import Future
+import base.signal as signal
 from loop import MainLoop
 from atom import Atom
 
 
+class RoundTripError(base.Exception):
+    pass
+
+
+def _request_size(args):
+    """Estimate the size in bytes of a request from its arguments."""
+    size = 4
+    for arg in args:
+        if isinstance(arg, basestring):
+            size += (len(arg) + 3) & ~3
+        elif isinstance(arg, (list, tuple)):
+            size += 4 * len(arg)
+        else:
+            size += 4
+    return size
+
+
+# Frames of these files are skipped when looking for a call site
+_internal_files = {}
+_this_file = os.path.splitext(__file__)[0]
+_base_dir = os.path.dirname(base.__file__)
+
+
+def _is_internal(filename):
+    internal = _internal_files.get(filename)
+    if internal is None:
+        name = os.path.splitext(filename)[0]
+        internal = _internal_files[filename] = \
+                   name == _this_file or os.path.dirname(name) == _base_dir
+    return internal
+
+
+def _call_site(frame):
+    """Return where frame, or the first caller outside this module and
+    bazinga.base, is."""
+    while frame.f_back is not None and _is_internal(frame.f_code.co_filename):
+        frame = frame.f_back
+    code = frame.f_code
+    return "{0}:{1} ({2})".format(code.co_filename, frame.f_lineno, code.co_name)
+
+
+class _AccountedCookie(object):
+    """Cookie of an accounted request."""
+
+    def __init__(self, connection, name, cookie):
+        self.connection = connection
+        self.name = name
+        self.cookie = cookie
+
+    def __getattr__(self, name):
+        return getattr(self.cookie, name)
+
+    def _wait(self, method):
+        self.connection._before_round_trip(self.name)
+        start = time.time()
+        try:
+            return method()
+        finally:
+            self.connection._account_round_trip(self.name, sys._getframe(2),
+                                                time.time() - start)
+
+    def reply(self):
+        return self._wait(self.cookie.reply)
+
+    def check(self):
+        return self._wait(self.cookie.check)
+
+
+class _AccountedCore(object):
+    """Core protocol of a connection, accounting requests and round trips."""
+
+    def __init__(self, connection, core):
+        self._connection = connection
+        self._core = core
+
+    def __getattr__(self, name):
+        method = getattr(self._core, name)
+        if name.startswith("_") or not callable(method):
+            return method
+
+        connection = self._connection
+        def request(*args):
+            cookie = method(*args)
+            connection._account_request(name, sys._getframe(1), args)
+            return _AccountedCookie(connection, name, cookie)
+
+        # Do not go through __getattr__ next time
+        setattr(self, name, request)
+        return request
+
+
 def byte_list_to_str(blist):
     """Convert a byte list to a string."""
     return struct.unpack_from("{0}s".format(len(blist)), blist.buf())[0]
@@ -25,24 +123,222 @@ def byte_list_to_uint32(blist):
 class Connection(Object, xcb.Connection):
     """A X connection."""
 
-    def __init__(self, loop=MainLoop(), *args, **kw):
+    # Event class: attribute of the event holding the xid it is routed to
+    events_xid_attribute = {}
+
+    # Drop events superseded by a later one read in the same batch
+    compress_events = False
+
+    # Compressed events: event class -> attributes of events superseding
+    # each other
+    compressed_events = {
+        xcb.xproto.MotionNotifyEvent: ("event", "state"),
+        xcb.xproto.ConfigureNotifyEvent: ("event", "window"),
+    }
+
+    # No event is compressed across these
+    compression_barriers = (xcb.Error,
+                            xcb.xproto.MapNotifyEvent,
+                            xcb.xproto.UnmapNotifyEvent,
+                            xcb.xproto.DestroyNotifyEvent,
+                            xcb.xproto.KeyPressEvent,
+                            xcb.xproto.KeyReleaseEvent,
+                            xcb.xproto.ButtonPressEvent,
+                            xcb.xproto.ButtonReleaseEvent)
+
+    # When a list, checked requests of new windows are stored there as
+    # (window, cookie) instead of being checked right away
+    _deferred_checks = None
+
+    # Check void requests right away instead of tracking them, raising
+    # their errors. Useful for tests.
+    strict_errors = False
+
+    # Maximum number of void requests tracked while waiting for their
+    # completion, older ones are assumed to have succeeded
+    max_tracked_requests = 4096
+
+    # Whether waiting for a reply in latency_critical receivers raises
+    # RoundTripError, or only prints a warning
+    round_trips_fatal = True
+
+    class RequestError(signal.Signal):
+        """Error signal of a void request.
+        This is sent on the X object the request was sent for, or on the
+        connection, with the error and the request name."""
+        pass
+
+    def __init__(self, loop=None, *args, **kw):
         """Initialize a X connection."""
 
         super(Connection, self).__init__(*args, **kw)
 
+        # Core protocol, and its accounting proxy when needed
+        self._raw_core = xcb.Connection.core.__get__(self, Connection)
+        self._accounted_core = None
+        # Request statistics while profiling, as (request stats, call site
+        # stats), see profile_requests()
+        self._request_profile = None
+        self._last_request_profile = ({}, {})
+        # Fatal flags of the active no_round_trips() blocks
+        self._round_trip_guards = []
+
+        if loop is None:
+            loop = MainLoop()
+
         # Initialize IO watcher
-        self._io = pyev.Io(self.get_file_descriptor(),
-                           pyev.EV_READ, loop,
-                           self._on_io)
-        self._io.start()
+        self._io = loop.watch_io(self.get_file_descriptor(), self._on_io)
 
         # Initialize Prepare watcher
-        self._prepare = pyev.Prepare(loop, self._prepare)
-        self._prepare.start()
+        self._prepare_watcher = loop.watch_prepare(self._prepare)
 
         # Store loop
         self.loop = loop
 
+        # Live X objects of this connection, indexed by xid
+        self._xobjects = weakref.WeakValueDictionary()
+
+        # Atoms of this connection, indexed by name and by value
+        self._atoms = {}
+        Atom.preload(self)
+
+        # Cached properties storing X properties, by class then atom
+        self._atom_properties = {}
+
+        # Number of events dropped by compression, by event class
+        self.dropped_events = {}
+
+        # Cursor font and cursors, by class, name and colors
+        self._cursor_font = None
+        self._cursors = {}
+
+        # Red, green and blue masks of TrueColor default colormaps, by
+        # colormap, computed from the setup on first use
+        self._truecolor_colormaps = None
+
+        # Void requests waiting for completion, in sequence order, as
+        # (sequence, request name, X object xid, callback)
+        self._tracked_requests = collections.deque()
+
+        # Replies waited for by the loop, in sequence order, as
+        # (sequence, cookie, future, time)
+        self._pending_replies = collections.deque()
+        # Sequence number of the last request sent to get an event back
+        self._sync_sequence = 0
+
+        # Time replies waited for by the loop stayed outstanding, by
+        # request name, as [ count, total time, maximum time ]
+        self.reply_stats = {}
+
+    @property
+    def core(self):
+        """Core protocol requests.
+        They are accounted while profiling requests and in no_round_trips()
+        blocks."""
+        return self._accounted_core or self._raw_core
+
+    def _update_core(self):
+        if self._request_profile is not None or self._round_trip_guards:
+            if self._accounted_core is None:
+                self._accounted_core = _AccountedCore(self, self._raw_core)
+        else:
+            self._accounted_core = None
+
+    def profile_requests(self, enabled=True):
+        """Start or stop accounting core requests.
+        Starting clears previous statistics, stopping keeps them readable."""
+        if enabled:
+            self._request_profile = ({}, {})
+        elif self._request_profile is not None:
+            self._last_request_profile = self._request_profile
+            self._request_profile = None
+        self._update_core()
+
+    @staticmethod
+    def _account(table, key, requests=0, replies=0, elapsed=0.0, size=0):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = [ 0, 0, 0.0, 0 ]
+        entry[0] += requests
+        entry[1] += replies
+        entry[2] += elapsed
+        entry[3] += size
+
+    def _account_request(self, name, frame, args):
+        if self._request_profile is not None:
+            requests, sites = self._request_profile
+            size = _request_size(args)
+            self._account(requests, name, requests=1, size=size)
+            self._account(sites, (_call_site(frame), name), requests=1, size=size)
+
+    def _account_round_trip(self, name, frame, elapsed):
+        if self._request_profile is not None:
+            requests, sites = self._request_profile
+            self._account(requests, name, replies=1, elapsed=elapsed)
+            self._account(sites, (_call_site(frame), name),
+                          replies=1, elapsed=elapsed)
+
+    def _before_round_trip(self, name):
+        if self._round_trip_guards:
+            message = "Waiting for a {0} reply in a no_round_trips() block.".format(name)
+            if self._round_trip_guards[-1]:
+                raise RoundTripError(message)
+            print >> sys.stderr, "Warning:", message
+            traceback.print_stack(sys._getframe(3))
+
+    def get_request_profile(self):
+        """Return request statistics of the current or last
+        profile_requests() run.
+        This is a dict with:
+            * "requests": request name -> stats;
+            * "call_sites": (call site, request name) -> stats, where call
+              site is where the request was sent or its reply waited for,
+              outside this module and bazinga.base.
+        Stats are dicts of "requests" sent, "replies" waited for, "time"
+        spent waiting in seconds and estimated request "bytes"."""
+        requests, sites = self._request_profile or self._last_request_profile
+        def _stats(entry):
+            return { "requests": entry[0],
+                     "replies": entry[1],
+                     "time": entry[2],
+                     "bytes": entry[3] }
+        return {
+            "requests": dict((key, _stats(entry))
+                             for key, entry in requests.iteritems()),
+            "call_sites": dict((key, _stats(entry))
+                               for key, entry in sites.iteritems()),
+        }
+
+    def dump_request_profile(self, output):
+        """Write request statistics to output, a file name or a file,
+        sorted by time spent waiting then number of requests."""
+        if isinstance(output, basestring):
+            with open(output, "w") as f:
+                return self.dump_request_profile(f)
+        stats = self.get_request_profile()
+        line = "{0:<70} {1:>8} {2:>8} {3:>10} {4:>10}\n"
+        def _sorted(table):
+            return sorted(table.iteritems(),
+                          key=lambda item: (-item[1]["time"], -item[1]["requests"]))
+        for title, table in (("request", stats["requests"]),
+                             ("call site", stats["call_sites"])):
+            output.write(line.format(title, "requests", "replies",
+                                     "wait (ms)", "bytes"))
+            for key, entry in _sorted(table):
+                if isinstance(key, tuple):
+                    key = "{0} {1}".format(*key)
+                output.write(line.format(key, entry["requests"],
+                                         entry["replies"],
+                                         "{0:.3f}".format(entry["time"] * 1000),
+                                         entry["bytes"]))
+            output.write("\n")
+
+    def no_round_trips(self, fatal=True):
+        """Return a context manager in which waiting for the reply of a core
+        request sent in the block raises RoundTripError, or only prints a
+        warning with the stack if fatal is False."""
+        return _NoRoundTrips(self, fatal)
+
     class roots(rocachedproperty):
         """Root windows."""
         def __get__(self):
@@ -125,23 +421,234 @@ class Connection(Object, xcb.Connection):
             cookies.append(method(*arguments))
         return cookies
 
-    def _on_io(self, watcher, events):
-        try:
-            while True:
+    def scan_tree(self, root):
+        """Return all windows below root, with their geometry, attributes
+        and parent cached.
+        The tree is walked breadth first, requests for all windows of a
+        level being sent before waiting for any reply, so this costs one
+        round trip per level of the tree. Windows destroyed during the scan
+        are left out. The number of windows and round trips and the time
+        spent are stored in scan_stats."""
+        from window import Window
+        start = time.time()
+        round_trips = 0
+        windows = set()
+        level = [ root ]
+        checks = []
+        while level:
+            query_trees = [ (window, self.core.QueryTree(window))
+                            for window in level ]
+            Window.prefetch(level, Window._scan_properties)
+            round_trips += 1
+            # Event masks of this level have been processed before our
+            # last requests: no round trip here.
+            for window, cookie in checks:
                 try:
-                    event = self.poll_for_event()
-                except xcb.ProtocolException as error:
-                    self.emit_signal(error.args[0])
-                else:
-                    if event:
-                        self.emit_signal(event)
-                    else:
-                        # No more event
-                        break
+                    cookie.check()
+                except xcb.ProtocolException:
+                    windows.discard(window)
+            level = []
+            checks = self._deferred_checks = []
+            try:
+                for window, cookie in query_trees:
+                    try:
+                        reply = cookie.reply()
+                    except xcb.ProtocolException:
+                        windows.discard(window)
+                        continue
+                    for xid in reply.children:
+                        child = Window(self, xid)
+                        Window.parent.set_cache(child, window)
+                        level.append(child)
+            finally:
+                self._deferred_checks = None
+            windows.update(level)
+
+        self.scan_stats = { "windows": len(windows),
+                            "round_trips": round_trips,
+                            "time": time.time() - start }
+        return windows
+
+    def _compress_events(self, batch):
+        """Drop events superseded by a later event of the same batch."""
+        latest = {}
+        kept = [ True ] * len(batch)
+        for index, event in enumerate(batch):
+            if isinstance(event, self.compression_barriers):
+                latest.clear()
+                continue
+            attributes = self.compressed_events.get(event.__class__)
+            if attributes:
+                key = (event.__class__,) + tuple([ getattr(event, attribute)
+                                                   for attribute in attributes ])
+                previous = latest.get(key)
+                if previous is not None:
+                    kept[previous] = False
+                    self.dropped_events[event.__class__] = \
+                            self.dropped_events.get(event.__class__, 0) + 1
+                latest[key] = index
+        return [ event for event, keep in zip(batch, kept) if keep ]
+
+    def void_request(self, name, args, xobject=None, callback=None):
+        """Send the void core request name with args without waiting for
+        the server.
+        If the request fails, RequestError is emitted on the X object of
+        xid xobject if it still exists, or on the connection, and callback
+        is called with the error. With strict_errors, the request is
+        checked right away."""
+        if self.strict_errors:
+            getattr(self.core, name + "Checked")(*args).check()
+            return
+        cookie = getattr(self.core, name)(*args)
+        if xobject is not None:
+            xobject = int(xobject)
+        self._tracked_requests.append((cookie.sequence, name, xobject, callback))
+        if len(self._tracked_requests) > self.max_tracked_requests:
+            self._tracked_requests.popleft()
+
+    def _complete_requests(self, sequence, error=None):
+        """Forget about tracked requests completed by the server, up to
+        sequence. If error is set, it is delivered to the request of
+        sequence."""
+        tracked = self._tracked_requests
+        # Responses only hold the lower 16 bits of sequence numbers
+        while tracked and (sequence - tracked[0][0]) & 0xffff < 0x8000:
+            request_sequence, name, xobject, callback = tracked.popleft()
+            if error is not None \
+               and (request_sequence - sequence) & 0xffff == 0:
+                self._deliver_error(error, name, xobject, callback)
+
+    def _deliver_error(self, error, name, xobject, callback):
+        """Deliver the error of a tracked request."""
+        if xobject is not None:
+            xobject = self._xobjects.get(xobject)
+        if xobject is None:
+            xobject = self
+        try:
+            xobject.emit_signal(self.RequestError, error=error, request=name)
+            if callback is not None:
+                callback(error)
         except Exception:
+            # A failing receiver must not stop the other requests
             traceback.print_exc()
 
-    def _prepare(self, watcher, events):
+    def wait_for_reply(self, cookie):
+        """Return a Future of the reply of cookie.
+        The reply is read by the I/O watcher once it is known to have
+        arrived, so the loop never blocks on it: signal handlers should
+        add their continuation as a callback of the future rather than
+        calling cookie.reply()."""
+        # Reading a reply known to have arrived is not a round trip
+        if isinstance(cookie, _AccountedCookie):
+            cookie = cookie.cookie
+        future = Future()
+        self._pending_replies.append((cookie.sequence, cookie, future,
+                                      time.time()))
+        return future
+
+    @property
+    def outstanding_replies(self):
+        """Number of replies waited for by the loop."""
+        return len(self._pending_replies)
+
+    def _resolve_replies(self, sequence):
+        """Resolve futures of replies to requests sent before sequence.
+        These replies have been read before the response of sequence."""
+        pending = self._pending_replies
+        now = time.time()
+        while pending and 0 < (sequence - pending[0][0]) & 0xffff < 0x8000:
+            request_sequence, cookie, future, sent = pending.popleft()
+            # GetGeometryCookie -> GetGeometry
+            name = cookie.__class__.__name__[:-len("Cookie")]
+            stats = self.reply_stats.get(name)
+            if stats is None:
+                stats = self.reply_stats[name] = [ 0, 0.0, 0.0 ]
+            stats[0] += 1
+            stats[1] += now - sent
+            stats[2] = max(stats[2], now - sent)
+            try:
+                try:
+                    reply = cookie.reply()
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(reply)
+            except Exception:
+                # A failing continuation must not stop the others
+                traceback.print_exc()
+
+    def _send_sync(self):
+        """Send a request generating an event, so that pending replies are
+        known to have arrived when it is received."""
+        # Appending nothing to a property still sends PropertyNotify
+        cookie = self.core.ChangeProperty(xcb.xproto.PropMode.Append,
+                                          self.roots[0],
+                                          Atom(self, "_BAZINGA_SYNC"),
+                                          Atom(self, "STRING"),
+                                          8, 0, "")
+        self._sync_sequence = cookie.sequence
+
+    def _on_io(self):
+        batch = []
+        while True:
+            try:
+                event = self.poll_for_event()
+            except xcb.ProtocolException as error:
+                batch.append(error.args[0])
+            except Exception:
+                # Still handle the events read so far
+                traceback.print_exc()
+                break
+            else:
+                if event:
+                    batch.append(event)
+                else:
+                    # No more event
+                    break
+        if self.compress_events:
+            batch = self._compress_events(batch)
+        for event in batch:
+            sequence = getattr(event, "sequence", None)
+            if sequence is not None and self._tracked_requests:
+                if isinstance(event, xcb.Error):
+                    self._complete_requests(sequence, event)
+                else:
+                    self._complete_requests(sequence)
+            if sequence is not None and self._pending_replies:
+                self._resolve_replies(sequence)
+            # A failing receiver must not drop the rest of the batch
+            try:
+                if isinstance(event, xcb.Error):
+                    self.emit_signal(event)
+                    self._route_error(event)
+                else:
+                    self.emit_signal(event)
+                    self._route_event(event)
+            except Exception:
+                traceback.print_exc()
+
+    def _route_event(self, event):
+        """Emit an event on the X object it belongs to, if any."""
+        try:
+            attribute = self.events_xid_attribute[event.__class__]
+        except KeyError:
+            return
+        xobject = self._xobjects.get(getattr(event, attribute))
+        if xobject is not None:
+            xobject.emit_signal(event)
+
+    def _route_error(self, error):
+        """Emit an error on the X object it belongs to, if any."""
+        xobject = self._xobjects.get(getattr(error, "bad_value", None))
+        if xobject is not None:
+            xobject.emit_signal(error)
+
+    def _prepare(self):
+        # Notify receivers may send requests: flush them in this iteration
+        flush_notify()
+        if self._pending_replies \
+           and self._pending_replies[-1][0] >= self._sync_sequence:
+            self._send_sync()
         self.flush()
 
     def set_text_property(self, window, atom_name, value):
@@ -152,20 +659,28 @@ class Connection(Object, xcb.Connection):
             string_atom = Atom(self, "STRING")
         self.core.ChangeProperty(xcb.xproto.Property.NewValue,
                                  window,
-                                 Atom(self, atom_name).value,
+                                 Atom(self, atom_name),
                                  string_atom,
                                  8, len(value), value)
 
-    def get_text_property(self, window, atom_name):
-        prop = self.core.GetProperty(False, window,
-                                     Atom(self, atom_name).value,
+    def request_text_property(self, window, atom_name):
+        """Send a request for a text property, returning its cookie."""
+        return self.core.GetProperty(False, window,
+                                     Atom(self, atom_name),
                                      xcb.xproto.GetPropertyType.Any,
-                                     0, 4096).reply()
-        if prop.type == Atom(self, "UTF8_STRING").value:
+                                     0, 4096)
+
+    def text_property_value(self, prop):
+        """Return the text of a text property reply."""
+        if prop.type == Atom(self, "UTF8_STRING"):
             return unicode(byte_list_to_str(prop.value), "UTF-8")
-        elif prop.type == Atom(self, "STRING").value:
+        elif prop.type == Atom(self, "STRING"):
             return byte_list_to_str(prop.value)
 
+    def get_text_property(self, window, atom_name):
+        return self.text_property_value(
+            self.request_text_property(window, atom_name).reply())
+
     def grab_pointer(self, window, cursor="left_ptr", confine_to=None):
         """Grab pointer on a window."""
         from cursor import Cursor
@@ -177,13 +692,45 @@ class Connection(Object, xcb.Connection):
                               xcb.xproto.GrabMode.Async,
                               xcb.xproto.GrabMode.Async,
                               confine_to,
-                              Cursor(window.colormap, cursor),
+                              Cursor.create(self, None, cursor),
                               xcb.xproto.Time.CurrentTime)
 
     def ungrab_pointer(self):
         self.core.UngrabPointer(xcb.xproto.Time.CurrentTime)
 
 
+class _NoRoundTrips(object):
+
+    def __init__(self, connection, fatal):
+        self.connection = connection
+        self.fatal = fatal
+
+    def __enter__(self):
+        self.connection._round_trip_guards.append(self.fatal)
+        self.connection._update_core()
+
+    def __exit__(self, type, value, traceback):
+        self.connection._round_trip_guards.pop()
+        self.connection._update_core()
+
+
+def latency_critical(func):
+    """Decorate a signal receiver so it runs in a no_round_trips() block of
+    the connection of its sender, fatal according to round_trips_fatal."""
+    @functools.wraps(func)
+    def _latency_critical(*args, **kw):
+        sender = kw.get("sender")
+        if isinstance(sender, Connection):
+            connection = sender
+        else:
+            connection = getattr(sender, "connection", None)
+        if connection is None:
+            return signal.robustapply.robust_apply(func, func, *args, **kw)
+        with connection.no_round_trips(connection.round_trips_fatal):
+            return signal.robustapply.robust_apply(func, func, *args, **kw)
+    return _latency_critical
+
+
 class MainConnection(Singleton, Connection):
     """Main X connection of bazinga."""
     pass
@@ -202,6 +749,8 @@ class XObject(SingletonPool, Object, int):
 
     def __init__(self, connection, xid):
         self.connection = connection
+        # Register ourselves so the connection routes events and errors to us
+        connection._xobjects[xid] = self
 
     @classmethod
     def create(cls, connection):
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+"""Measure event dispatch cost as the number of live windows grows.
+This needs a running X server (Xvfb is fine)."""
+
+import timeit
+
+from bazinga.x import Connection
+from bazinga.window import Window
+
+
+class FakeMotionNotifyEvent(object):
+    """Stand-in for xcb.xproto.MotionNotifyEvent, which can't be built
+    from Python."""
+
+    def __init__(self, event):
+        self.event = event
+
+
+def main(counts=(10, 100, 1000, 3000), events=10000):
+    connection = Connection()
+    Connection.events_xid_attribute[FakeMotionNotifyEvent] = "event"
+    root = connection.roots[0]
+    windows = []
+    print "{0:>8} {1:>14}".format("windows", "usec/event")
+    for count in counts:
+        while len(windows) < count:
+            windows.append(root.create_subwindow())
+        connection.flush()
+        event = FakeMotionNotifyEvent(windows[0])
+        elapsed = timeit.timeit(lambda: connection._route_event(event),
+                                number=events)
+        print "{0:>8} {1:>14.3f}".format(count, elapsed / events * 1e6)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+
+"""Measure setting and reading window icons of various sizes.
+This needs a running X server (Xvfb is fine)."""
+
+import timeit
+
+from PIL import Image
+
+from bazinga.x import Connection
+from bazinga.window import Window
+
+
+def main(sizes=(16, 48, 128, 256), number=20):
+    connection = Connection()
+    window = connection.roots[0].create_subwindow()
+
+    def set_icon():
+        window.icon = image
+        connection.flush()
+
+    def get_icon():
+        Window.icon.del_cache(window)
+        Window.icons.del_cache(window)
+        window.icon.load()
+
+    print "{0:>6} {1:>12} {2:>12}".format("size", "set (ms)", "get (ms)")
+    for size in sizes:
+        image = Image.new("RGBA", (size, size), (255, 128, 0, 200))
+        set_time = timeit.timeit(set_icon, number=number) / number
+        get_time = timeit.timeit(get_icon, number=number) / number
+        print "{0:>6} {1:>12.3f} {2:>12.3f}".format(size, set_time * 1000,
+                                                   get_time * 1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""Compare the latency of the pyev and asyncio loop backends.
+A timer writes timestamps on pipes at a fixed rate, and the latency is
+the time between the write and the read watcher callback. This does not
+need an X server."""
+
+import os
+import struct
+import time
+
+from bazinga.loop import Loop, AsyncioLoop
+
+
+def measure(loop, events, pipes, interval):
+    """Return sorted latencies of events spread over pipes."""
+    latencies = []
+    fds = [ os.pipe() for i in range(pipes) ]
+    watchers = []
+
+    def make_reader(fd):
+        def on_read():
+            sent, = struct.unpack("d", os.read(fd, 8))
+            latencies.append(time.time() - sent)
+            if len(latencies) == events:
+                loop.stop()
+        return on_read
+
+    for r, w in fds:
+        watchers.append(loop.watch_io(r, make_reader(r)))
+
+    sent = [ 0 ]
+    def on_timeout():
+        if sent[0] < events:
+            os.write(fds[sent[0] % pipes][1], struct.pack("d", time.time()))
+            sent[0] += 1
+
+    timer = loop.watch_timer(interval, interval, on_timeout)
+    timer.start()
+    loop.run()
+    timer.stop()
+    for watcher in watchers:
+        watcher.stop()
+    for r, w in fds:
+        os.close(r)
+        os.close(w)
+    return sorted(latencies)
+
+
+def main(events=5000, pipes=16, interval=0.0005):
+    backends = [ ("pyev", Loop()) ]
+    try:
+        backends.append(("asyncio", AsyncioLoop()))
+    except ImportError:
+        print "asyncio backend unavailable: install trollius"
+
+    print "{0:>8} {1:>10} {2:>10} {3:>10} {4:>10}".format(
+        "backend", "mean (us)", "p50 (us)", "p99 (us)", "max (us)")
+    for name, loop in backends:
+        latencies = measure(loop, events, pipes, interval)
+        print "{0:>8} {1:>10.1f} {2:>10.1f} {3:>10.1f} {4:>10.1f}".format(
+            name,
+            sum(latencies) / len(latencies) * 1e6,
+            latencies[len(latencies) / 2] * 1e6,
+            latencies[len(latencies) * 99 / 100] * 1e6,
+            latencies[-1] * 1e6)
+
+
+if __name__ == "__main__":
+    main()
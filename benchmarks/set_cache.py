@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+"""Measure cached property writes on objects with and without Notify
+receivers."""
+
+import timeit
+
+from bazinga.base.object import Object
+from bazinga.base.property import cachedproperty
+
+
+class Phone(Object):
+
+    class number(cachedproperty):
+        pass
+
+
+def main(writes=100000):
+    phone = Phone()
+    elapsed = timeit.timeit(lambda: Phone.number.set_cache(phone, 1),
+                            number=writes)
+    print "no receiver: {0:>10.0f} set_cache/s".format(writes / elapsed)
+
+    listened = Phone()
+    def receiver():
+        pass
+    listened.connect_notify(receiver, "number")
+    elapsed = timeit.timeit(lambda: Phone.number.set_cache(listened, 1),
+                            number=writes)
+    print "receiver:    {0:>10.0f} set_cache/s".format(writes / elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+"""Measure pooled object construction throughput."""
+
+import timeit
+
+from bazinga.base.object import Notify
+from bazinga.base.singleton import SingletonPool
+
+
+class Point(SingletonPool):
+    _SingletonPool__instances = {}
+
+    def __init__(self, x, y):
+        pass
+
+
+class KeyedPoint(SingletonPool):
+    _SingletonPool__instances = {}
+    _SingletonPool__key = ("x", "y")
+
+    def __init__(self, x, y):
+        pass
+
+
+def main(constructions=100000):
+    for name, construct in (("Notify(key)", lambda: Notify("width")),
+                            ("Point(x, y)", lambda: Point(1, 2)),
+                            ("KeyedPoint(x, y)", lambda: KeyedPoint(1, 2)),
+                            ("Point(list, y)", lambda: Point([ 1 ], 2))):
+        elapsed = timeit.timeit(construct, number=constructions)
+        print "{0:<18} {1:>10.0f} calls/s".format(name, constructions / elapsed)
+
+
+if __name__ == "__main__":
+    main()
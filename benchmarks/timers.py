@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+"""Compare loop wakeups and CPU time of many repeating timers, each with
+its own loop timer or sharing a TimerWheel. This does not need an X
+server."""
+
+import random
+import resource
+
+from bazinga.loop import Loop
+from bazinga.timer import Timer
+
+
+def measure(count, slack, duration):
+    """Return loop iterations, timeouts and CPU time of count timers."""
+    loop = Loop()
+    random.seed(0)
+    timeouts = [ 0 ]
+
+    @Timer.on_class_signal(Timer.Timeout)
+    def on_timeout(sender, signal):
+        timeouts[0] += 1
+
+    timers = [ Timer(random.uniform(0, 1), random.uniform(0.5, 2),
+                     loop, slack)
+               for i in xrange(count) ]
+    for timer in timers:
+        timer.start()
+
+    iterations = [ 0 ]
+    def on_prepare():
+        iterations[0] += 1
+    loop.watch_prepare(on_prepare)
+    end = loop.watch_timer(duration, 0, loop.stop)
+    end.start()
+
+    start = resource.getrusage(resource.RUSAGE_SELF).ru_utime
+    loop.run()
+    cpu = resource.getrusage(resource.RUSAGE_SELF).ru_utime - start
+
+    for timer in timers:
+        timer.stop()
+    Timer.disconnect_class_signal(on_timeout, Timer.Timeout)
+    return iterations[0], timeouts[0], cpu
+
+
+def main(count=10000, slacks=(0, 0.01, 0.05, 0.1), duration=5):
+    print "{0:>8} {1:>14} {2:>10} {3:>10}".format(
+        "slack", "wakeups/s", "timeouts", "cpu (s)")
+    for slack in slacks:
+        iterations, timeouts, cpu = measure(count, slack, duration)
+        print "{0:>8} {1:>14.1f} {2:>10} {3:>10.2f}".format(
+            slack, iterations / float(duration), timeouts, cpu)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+import unittest
+
+from bazinga.base.future import Future, NotDone
+
+
+class TestFuture(unittest.TestCase):
+
+    def setUp(self):
+        self.future = Future()
+
+    def test_result(self):
+        self.assert_(not self.future.done())
+        self.assertRaises(NotDone, self.future.result)
+        self.future.set_result(42)
+        self.assert_(self.future.done())
+        self.assert_(self.future.result() == 42)
+        self.assert_(self.future.exception() is None)
+
+    def test_exception(self):
+        self.future.set_exception(KeyError("foo"))
+        self.assertRaises(KeyError, self.future.result)
+        self.assert_(isinstance(self.future.exception(), KeyError))
+
+    def test_callback(self):
+        called = []
+        self.future.add_callback(called.append)
+        self.assert_(called == [])
+        self.future.set_result(1)
+        self.assert_(called == [ self.future ])
+        self.future.add_callback(called.append)
+        self.assert_(called == [ self.future, self.future ])
+
+    def test_then(self):
+        doubled = self.future.then(lambda value: value * 2)
+        failed = doubled.then(lambda value: value / 0)
+        never = failed.then(lambda value: value + 1)
+        self.future.set_result(21)
+        self.assert_(doubled.result() == 42)
+        self.assertRaises(ZeroDivisionError, failed.result)
+        self.assertRaises(ZeroDivisionError, never.result)
+
+    def test_from_call(self):
+        self.assert_(Future.from_call(int, "3").result() == 3)
+        self.assertRaises(ValueError, Future.from_call(int, "x").result)
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(unittest.main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import unittest
+
+from bazinga.idle import IdleQueue
+
+
+class Watcher(object):
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.active = False
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+
+class Loop(object):
+    """Loop running idle watchers when told to."""
+
+    def watch_idle(self, callback):
+        self.idle = Watcher(callback)
+        return self.idle
+
+    def run(self):
+        while self.idle.active:
+            self.idle.callback()
+
+
+class TestIdleQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = Loop()
+        self.queue = IdleQueue.get(self.loop)
+        self.done = []
+
+    def test_get(self):
+        self.assert_(IdleQueue.get(self.loop) is self.queue)
+
+    def test_priority(self):
+        self.queue.add(self.done.append, ("late",), priority=10)
+        self.queue.add(self.done.append, ("first",))
+        self.queue.add(self.done.append, ("second",))
+        self.assert_(self.queue.depth == 3)
+        self.assert_(self.loop.idle.active)
+        self.loop.run()
+        self.assert_(self.done == [ "first", "second", "late" ])
+        self.assert_(self.queue.depth == 0)
+        self.assert_(self.queue.stats["done"] == 3)
+
+    def test_cancel(self):
+        job = self.queue.add(self.done.append, ("cancelled",))
+        job.cancel()
+        self.assert_(self.queue.depth == 0)
+        self.assert_(not self.loop.idle.active)
+        self.queue.add(self.done.append, ("kept",))
+        self.loop.run()
+        self.assert_(self.done == [ "kept" ])
+        self.assert_(self.queue.stats["cancelled"] == 1)
+
+    def test_slices(self):
+        def work(n):
+            for i in range(n):
+                self.done.append(i)
+                yield
+        self.queue.budget = -1
+        self.queue.add(work, (3,))
+        self.loop.idle.callback()
+        self.assert_(self.done == [ 0 ])
+        self.loop.run()
+        self.assert_(self.done == [ 0, 1, 2 ])
+        self.assert_(self.queue.stats["slices"] == 4)
+
+    def test_cancel_slices(self):
+        def work():
+            while True:
+                self.done.append(None)
+                yield
+        self.queue.budget = -1
+        job = self.queue.add(work)
+        self.loop.idle.callback()
+        job.cancel()
+        self.loop.run()
+        self.assert_(len(self.done) == 1)
+
+    def test_cancel_running(self):
+        closed = []
+        def work():
+            try:
+                while True:
+                    self.done.append(None)
+                    jobs[0].cancel()
+                    yield
+            finally:
+                closed.append(True)
+        jobs = []
+        jobs.append(self.queue.add(work))
+        self.loop.run()
+        self.assert_(len(self.done) == 1)
+        self.assert_(closed == [ True ])
+        self.assert_(self.queue.depth == 0)
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(unittest.main())
@@ -2,10 +2,17 @@
 
 import unittest
 
-from bazinga.base.object import Object
+from bazinga.base.object import Object, Notify, defer_notify, flush_notify
+import bazinga.base.signal as bsignal
+from bazinga.base.property import cachedproperty
 
 class TestObject(unittest.TestCase):
 
+    class Phone(Object):
+
+        class number(cachedproperty):
+            pass
+
     def setUp(self):
         self.k = Object()
 
@@ -17,6 +24,94 @@ class TestObject(unittest.TestCase):
         self.k.some_value = 1
         self.assert_(self.k.has_changed)
 
+    def _count_notify(self, key):
+        self.notified = 0
+        @self.k.on_notify(key)
+        def x(sender, signal):
+            self.notified += 1
+        return x
+
+    def test_freeze_notify(self):
+        receiver = self._count_notify("some_value")
+        with self.k.freeze_notify():
+            self.k.some_value = 1
+            self.k.some_value = 2
+            self.assertEqual(self.notified, 0)
+        self.assertEqual(self.notified, 1)
+
+    def test_freeze_notify_nested(self):
+        receiver = self._count_notify("some_value")
+        self.k.freeze_notify()
+        with self.k.freeze_notify():
+            self.k.some_value = 1
+        self.assertEqual(self.notified, 0)
+        self.k.thaw_notify()
+        self.assertEqual(self.notified, 1)
+
+    def test_notify_connected_later(self):
+        self.k.some_value = 1
+        receiver = self._count_notify("some_value")
+        self.k.some_value = 2
+        self.assertEqual(self.notified, 1)
+
+    def test_class_notify(self):
+        self.notified = 0
+        phone = self.Phone()
+        phone.number = 1
+        def receiver(sender, signal):
+            self.notified += 1
+        self.Phone.connect_class_notify(receiver, "number")
+        try:
+            phone.number = 2
+            self.assertEqual(self.notified, 1)
+        finally:
+            self.Phone.disconnect_class_notify(receiver, "number")
+        phone.number = 3
+        self.assertEqual(self.notified, 1)
+
+    def test_set_cache_notify_once(self):
+        self.signals = []
+        phone = self.Phone()
+        @phone.on_signal(Notify)
+        def receiver(sender, signal):
+            self.signals.append(signal.attribute)
+        self.Phone.number.set_cache(phone, 1)
+        self.assertEqual(self.signals, [ "number" ])
+
+    def test_unlistened_notify_not_emitted(self):
+        # Like Window, with receivers on some keys of the class only
+        class Renotified(Object):
+            pass
+        def receiver(sender, signal):
+            pass
+        Renotified.connect_class_signal(receiver, Notify("listened"))
+        emitted = []
+        emit = bsignal.emit
+        bsignal.emit = lambda *args, **kw: emitted.append(args)
+        try:
+            obj = Renotified()
+            obj.other = 1
+            self.assertEqual(emitted, [])
+            obj.listened = 1
+            self.assertEqual(len(emitted), 1)
+        finally:
+            bsignal.emit = emit
+            Renotified.disconnect_class_signal(receiver, Notify("listened"))
+
+    def test_defer_notify(self):
+        receiver = self._count_notify("some_value")
+        defer_notify()
+        try:
+            self.k.some_value = 1
+            self.k.some_value = 2
+            self.assertEqual(self.notified, 0)
+            flush_notify()
+            self.assertEqual(self.notified, 1)
+            flush_notify()
+            self.assertEqual(self.notified, 1)
+        finally:
+            defer_notify(False)
+
 
 if __name__ == "__main__":
     import sys
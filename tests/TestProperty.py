@@ -2,7 +2,73 @@
 
 import unittest
 
-from bazinga.base.property import cachedproperty, rocachedproperty
+from bazinga.base.property import cachedproperty, rocachedproperty, prefetch
+from bazinga.base.future import Future
+from bazinga.base.object import Object
+
+
+class Cookie(object):
+
+    def __init__(self, value):
+        self.value = value
+
+    def reply(self):
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value
+
+
+class Connection(object):
+    """Connection reading replies when told to."""
+
+    def __init__(self):
+        self.pending = []
+
+    def wait_for_reply(self, cookie):
+        future = Future()
+        self.pending.append((cookie, future))
+        return future
+
+    def resolve(self):
+        pending, self.pending = self.pending, []
+        for cookie, future in pending:
+            future.set_result(cookie.reply())
+
+
+def _request_size(box):
+    box.requests += 1
+    return Cookie(box.size)
+
+
+def _update_size(box, reply):
+    box.__class__.width.set_cache(box, reply[0])
+    box.__class__.height.set_cache(box, reply[1])
+
+
+class Titled(Object):
+    """Object with a title made of two properties, like Window.name."""
+
+    _fetch_aliases = { "title": ("_new_title", "_old_title") }
+
+    def __init__(self, new_title, old_title):
+        self.titles = (new_title, old_title)
+        self.connection = Connection()
+
+    class _new_title(cachedproperty):
+        def __request__(self):
+            return Cookie(self.titles[0])
+        def __reply__(self, reply):
+            return reply
+
+    class _old_title(cachedproperty):
+        def __request__(self):
+            return Cookie(self.titles[1])
+        def __reply__(self, reply):
+            return reply
+
+    @property
+    def title(self):
+        return self._new_title or self._old_title
 
 
 class TestCachedProperty(unittest.TestCase):
@@ -21,6 +87,37 @@ class TestCachedProperty(unittest.TestCase):
         class roprop(rocachedproperty):
             pass
 
+        class owner(rocachedproperty):
+            atom = "PHONE_OWNER"
+
+    class Box(object):
+
+        requests = 0
+
+        def __init__(self, size):
+            self.size = size
+            self.connection = Connection()
+
+        class width(cachedproperty):
+            __request__ = _request_size
+            __reply__ = _update_size
+
+        class height(cachedproperty):
+            __request__ = _request_size
+            __reply__ = _update_size
+
+        class label(rocachedproperty):
+            def __request__(self):
+                self.requests += 1
+                return Cookie("box")
+            def __reply__(self, reply):
+                return reply
+
+        class depth(rocachedproperty):
+            __request__ = _request_size
+            def __reply__(self, reply):
+                return None
+
     def setUp(self):
         self.p = self.Phone()
 
@@ -57,6 +154,95 @@ class TestCachedProperty(unittest.TestCase):
         except AttributeError:
             pass
 
+    def test_atom(self):
+        self.assert_(self.Phone.owner.atom == "PHONE_OWNER")
+        self.assert_(self.Phone.number.atom is None)
+
+    def test_request_reply(self):
+        box = self.Box((2, 3))
+        self.assert_(box.height == 3)
+        self.assert_(box.width == 2)
+        self.assert_(box.label == "box")
+        self.assert_(box.requests == 2)
+
+    def test_prefetch(self):
+        boxes = [ self.Box((i, i + 1)) for i in range(3) ]
+        prefetch(boxes, [ self.Box.width, self.Box.height, self.Box.label ])
+        for i, box in enumerate(boxes):
+            self.assert_(box.requests == 2)
+            self.assert_(box.width == i)
+            self.assert_(box.height == i + 1)
+            self.assert_(box.label == "box")
+            self.assert_(box.requests == 2)
+
+    def test_prefetch_cached(self):
+        box = self.Box((2, 3))
+        self.Box.label.set_cache(box, "cached")
+        prefetch([ box ], [ self.Box.label ])
+        self.assert_(box.requests == 0)
+        self.assert_(box.label == "cached")
+
+    def test_prefetch_ignore(self):
+        box = self.Box(KeyError())
+        prefetch([ box ], [ self.Box.width ], KeyError)
+        self.assert_(not self.Box.width.is_cached(box))
+        self.assertRaises(KeyError, prefetch, [ box ], [ self.Box.width ])
+
+    def test_fetch(self):
+        box = self.Box((2, 3))
+        width = self.Box.width.fetch(box)
+        height = self.Box.height.fetch(box)
+        self.assert_(not width.done())
+        self.assert_(box.requests == 1)
+        self.assert_(not self.Box.width.is_cached(box))
+        box.connection.resolve()
+        self.assert_(width.result() == 2)
+        self.assert_(height.result() == 3)
+        self.assert_(box.width == 2)
+        self.assert_(box.requests == 1)
+
+    def test_fetch_cached(self):
+        box = self.Box((2, 3))
+        self.Box.label.set_cache(box, "cached")
+        label = self.Box.label.fetch(box)
+        self.assert_(label.result() == "cached")
+        self.assert_(box.requests == 0)
+        self.assert_(self.Phone.name.fetch(self.p).result() == "Morcheeba")
+
+    def test_fetch_then(self):
+        box = self.Box((2, 3))
+        labels = []
+        self.Box.label.fetch(box).then(str.upper).add_callback(
+            lambda future: labels.append(future.result()))
+        self.assert_(labels == [])
+        box.connection.resolve()
+        self.assert_(labels == [ "BOX" ])
+
+    def test_fetch_alias(self):
+        titled = Titled("new", "old")
+        title = titled.fetch("title")
+        self.assert_(len(titled.connection.pending) == 2)
+        titled.connection.resolve()
+        self.assert_(title.result() == "new")
+        titled = Titled(None, "old")
+        title = titled.fetch("title")
+        titled.connection.resolve()
+        self.assert_(title.result() == "old")
+        titled = Titled(None, None)
+        title = titled.fetch("title")
+        titled.connection.resolve()
+        self.assertRaises(AttributeError, title.result)
+
+    def test_fetch_no_value(self):
+        box = self.Box((2, 3))
+        depth = self.Box.depth.fetch(box)
+        box.connection.resolve()
+        self.assertRaises(AttributeError, depth.result)
+        # The reply is not asked for again
+        self.assert_(box.requests == 1)
+        self.assert_(box.connection.pending == [])
+
+
 if __name__ == "__main__":
     import sys
     sys.exit(unittest.main())
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+import unittest
+
+from bazinga.region import Region
+
+
+class TestRegion(unittest.TestCase):
+
+    def test_empty(self):
+        region = Region()
+        self.assert_(not region)
+        self.assert_(region.extents is None)
+        region.add(1, 1, 0, 10)
+        self.assert_(not region)
+
+    def test_disjoint(self):
+        region = Region([ (0, 0, 10, 10), (20, 20, 5, 5) ])
+        self.assert_(len(region) == 2)
+        self.assert_(region.extents == (0, 0, 25, 25))
+
+    def test_overlap(self):
+        region = Region([ (0, 0, 10, 10), (5, 5, 10, 10) ])
+        self.assert_(list(region) == [ (0, 0, 15, 15) ])
+
+    def test_strips(self):
+        region = Region([ (0, y, 100, 1) for y in range(20) ])
+        self.assert_(list(region) == [ (0, 0, 100, 20) ])
+
+    def test_chain_merge(self):
+        region = Region([ (0, 0, 10, 10), (20, 0, 10, 10), (10, 0, 10, 10) ])
+        self.assert_(list(region) == [ (0, 0, 30, 10) ])
+
+    def test_bounding_box_fallback(self):
+        region = Region()
+        region.max_rectangles = 4
+        for i in range(5):
+            region.add(i * 10, i * 10, 5, 5)
+        self.assert_(list(region) == [ (0, 0, 45, 45) ])
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(unittest.main())
@@ -3,7 +3,7 @@
 import unittest
 
 import bazinga.base.signal as signal
-from bazinga.base.object import Object
+from bazinga.base.object import Object, Notify
 
 class TestSignal(unittest.TestCase):
     class Yack(Object):
@@ -50,6 +50,61 @@ class TestSignal(unittest.TestCase):
         y = self.Yack()
         self._test_signal(y, y)
 
+    def test_connect_after_emit(self):
+        y = self.Yack()
+        y.emit_signal("yo")
+        self._test_sender(y, self.Yack)
+
+    def test_disconnect_after_emit(self):
+        y = self.Yack()
+        self._test_sender(y, self.Yack)
+        self.has_changed = False
+        y.emit_signal("yo")
+        self.assert_(not self.has_changed)
+
+    def test_dead_receiver(self):
+        y = self.Yack()
+        def receiver():
+            self.has_changed = True
+        signal.connect(receiver, signal="yo", sender=self.Yack)
+        y.emit_signal("yo")
+        del receiver
+        self.has_changed = False
+        y.emit_signal("yo")
+        self.assert_(not self.has_changed)
+
+    def test_receiver_called_once(self):
+        self.calls = 0
+        def receiver():
+            self.calls += 1
+        y = self.Yack()
+        signal.connect(receiver, signal="yo", sender=self.Yack)
+        signal.connect(receiver, signal="yo", sender=y)
+        y.emit_signal("yo")
+        self.assertEqual(self.calls, 1)
+
+    def test_profile(self):
+        def receiver():
+            pass
+        signal.connect(receiver, signal="yo", sender=self.Yack)
+        yack = self.Yack()
+        signal.profile()
+        signal.emit(signal="yo", sender=yack)
+        signal.emit(signal="yo", sender=yack)
+        signal.emit(signal=Notify("a"), sender=yack)
+        signal.emit(signal=Notify("b"), sender=yack)
+        signal.profile(False)
+        signal.emit(signal="yo", sender=yack)
+        stats = signal.get_profile()
+        entry = stats["signals"][("Yack", "'yo'")]
+        self.assert_(entry["count"] == 2)
+        self.assert_(entry["fanout"] == 2)
+        self.assert_(entry["max"] <= entry["total"])
+        self.assert_(stats["receivers"][__name__ + ".receiver"]["count"] == 2)
+        self.assert_(stats["signals"][("Yack", "<Notify 'a'>")]["count"] == 1)
+        self.assert_(stats["signals"][("Yack", "<Notify 'b'>")]["count"] == 1)
+        signal.disconnect(receiver, signal="yo", sender=self.Yack)
+
 
 if __name__ == "__main__":
     import sys
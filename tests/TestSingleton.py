@@ -11,6 +11,18 @@ class TestSingleton(unittest.TestCase):
         def __init__(self, x, y):
             pass
 
+    class Name(SingletonPool):
+        _SingletonPool__instances = {}
+        _SingletonPool__key = ("name",)
+        def __init__(self, name, size=12):
+            pass
+
+    class Vector(SingletonPool):
+        _SingletonPool__instances = {}
+        _SingletonPool__key = ("x", "y")
+        def __init__(self, x, y=0, label=None):
+            pass
+
     def test_singleton_identity(self):
         self.assert_(Singleton() is Singleton())
 
@@ -18,6 +30,32 @@ class TestSingleton(unittest.TestCase):
         self.assert_(self.Point(1, 2) is not self.Point(1, 3))
         self.assert_(self.Point(1, 2) is self.Point(1, 2))
 
+    def test_singleton_pool_keywords(self):
+        self.assert_(self.Point(1, y=2) is self.Point(1, y=2))
+        self.assert_(self.Point(1, y=2) is not self.Point(1, 2))
+
+    def test_singleton_pool_unhashable(self):
+        self.assert_(self.Point([ 1 ], 2) is self.Point([ 1 ], 2))
+        self.assert_(self.Point([ 1 ], 2) is not self.Point([ 2 ], 2))
+
+    def test_singleton_pool_interned(self):
+        self.assert_(self.Name("a") is self.Name(name="a"))
+        self.assert_(self.Name("a") is self.Name("a", 14))
+        self.assert_(self.Name("a") is not self.Name("b"))
+        self.assert_(self.Name("a") is self.Name._SingletonPool__instances["a"])
+        # Keys made of all arguments do not collide with interned values
+        self.assert_(self.Name(None) is not self.Name((None,)))
+        self.assert_(self.Name([ "a" ]) is self.Name([ "a" ]))
+        self.assert_(self.Name([ "a" ]) is not
+                     self.Name(self.Name.__getpoolkey__([ "a" ])[1]))
+
+    def test_singleton_pool_key(self):
+        self.assert_(self.Vector(1) is self.Vector(1, 0))
+        self.assert_(self.Vector(1, 2) is self.Vector(y=2, x=1))
+        self.assert_(self.Vector(1, 2) is self.Vector(1, 2, "label"))
+        self.assert_(self.Vector(1, 2) is not self.Vector(2, 1))
+        self.assertRaises(TypeError, self.Vector)
+
 
 if __name__ == "__main__":
     import sys
@@ -19,6 +19,21 @@ class TestTimer(unittest.TestCase):
         MainLoop().loop()
         self.assert_(self.called)
 
+    def test_wheel(self):
+        fired = []
+        timers = [ Timer(0.01 * i, 0, slack=0.05) for i in range(1, 4) ]
+        # Receivers are weakly referenced
+        self.receivers = [ lambda sender, signal, i=i: fired.append(i)
+                           for i in range(3) ]
+        for timer, receiver in zip(timers, self.receivers):
+            timer.start()
+            timer.on_timeout(receiver)
+        timers[1].stop()
+        self.assert_(not timers[1].active)
+        MainLoop().loop()
+        self.assert_(fired == [ 0, 2 ])
+        self.assert_(not timers[0].active)
+
 if __name__ == "__main__":
     import sys
     sys.exit(unittest.main())